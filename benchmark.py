@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""Headless benchmarks of the listing, sorting and transfer code paths of main.py.
+
+Needs neither a display nor a device: adb is fake_adb.py and the adb server is
+fake_adb_server.py, serving synthetic directories (odd file names, symlinks and an
+app sandbox for run-as included) with optional latency and bandwidth limits. Treeview
+insertion needs a display and is not measured. Results are JSON; --compare reports the
+change against an earlier run and exits with status 1 if anything got slower by more
+than --threshold:
+
+    python3 benchmark.py --sizes 10,1000,100000 --output bench_output.txt
+    python3 benchmark.py --sizes 10,1000,100000 --compare bench_output.txt
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import main as adb_gui
+from fake_adb_server import FakeAdbServer
+
+SERIAL = "bench"
+PACKAGE = "com.example.bench"
+ODD_NAMES = [
+    "with space", "tab\there", "new\nline", "-leading-dash", "it's", 'say "hi"', "back\\slash",
+    "ünïcödé", "日本語", "emoji 📁", "semi;colon", "$HOME", "*star?", "trailing space ", "[x]",
+]
+EXTENSIONS = ["jpg", "mp4", "txt", "db", "so", "apk", "json"]
+
+class HeadlessManager(adb_gui.ADBFileManager):
+    """ADBFileManager without a window: only the state its adb code paths use."""
+
+    def __init__(self, device_id, server):
+        self.device_id = device_id
+        self.devices = [device_id]
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
+        self.listing_formats = {}
+        self.server = server
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def make_tree(path, count, seed=0):
+    """Fill path with count entries: 1 in 20 a directory, 1 in 20 a dangling symlink, the
+    rest sparse files of random size and age; every 7th name is an odd one."""
+    done_marker = path + ".complete"
+    if os.path.exists(done_marker):
+        return
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(count):
+        if i % 7 == 0:
+            name = f"{ODD_NAMES[i // 7 % len(ODD_NAMES)]} {i}"
+        else:
+            name = f"file_{i:07d}.{rng.choice(EXTENSIONS)}"
+        full = os.path.join(path, name)
+        if i % 20 == 0:
+            os.mkdir(full)
+        elif i % 20 == 1:
+            os.symlink("missing-" + name, full)
+        else:
+            with open(full, "wb") as f:
+                f.truncate(rng.randrange(1 << 24))
+            mtime = now - rng.randrange(10 ** 8)
+            os.utime(full, (mtime, mtime))
+    open(done_marker, "w").close()
+
+def best_of(repeat, fn):
+    """Run fn() repeat times; return (lowest seconds, result of that run)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, result)
+    return best
+
+def bench_parse(results, tree, size, repeat):
+    """Parser throughput on real listing output of the tree, fed in STREAM_CHUNK pieces."""
+    for fmt, (_, _, parser_class) in adb_gui.LISTING_FORMATS.items():
+        command = adb_gui.listing_command(fmt, tree)
+        output = subprocess.run(["sh", "-c", command], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+
+        def parse():
+            parser = parser_class()
+            entries = []
+            for i in range(0, len(output), adb_gui.STREAM_CHUNK):
+                entries += parser.feed(output[i:i + adb_gui.STREAM_CHUNK])
+            return entries + parser.close()
+
+        seconds, entries = best_of(repeat, parse)
+        results[f"parse/{fmt}/{size}"] = {
+            "seconds": seconds,
+            "entries": len(entries),
+            "entries_per_s": len(entries) / seconds if seconds else None,
+            "mb_per_s": len(output) / 1e6 / seconds if seconds else None,
+        }
+        if fmt == "find":
+            sort_input = entries
+    for spec_name, spec in (("name", [("1", True)]), ("size", [("2", False)]), ("date+name", [("5", True), ("1", True)])):
+        seconds, _ = best_of(repeat, lambda: adb_gui.sort_entries(sort_input, spec))
+        results[f"sort/{spec_name}/{size}"] = {"seconds": seconds, "entries": len(sort_input)}
+
+def bench_listing(results, app, fmt, path, size, repeat, run_as=""):
+    """fetch_listing through fake adb (or the fake server for "native") plus the sort list_files does."""
+    native = fmt == "native"
+    if not native:
+        app.listing_formats[(SERIAL, run_as)] = fmt
+    job = adb_gui.Job(None, "bench")
+
+    def listing():
+        start = time.perf_counter()
+        first = []
+
+        def on_rows(rows):
+            if not first:
+                first.append(time.perf_counter() - start)
+
+        listing, error = app.fetch_listing(job, SERIAL, run_as, path, native, on_rows)
+        fetched = time.perf_counter() - start
+        if listing is None:
+            raise adb_gui.AdbError(error or f"no listing of {path}")
+        adb_gui.sort_entries(listing[1], [("1", True)])
+        return fetched, min(first + [fetched]), len(listing[1])
+
+    seconds, (fetched, first_row, entries) = best_of(repeat, listing)
+    tracemalloc.start()
+    listing()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    name = f"listing/{fmt}{'/run-as' if run_as else ''}/{size}"
+    results[name] = {
+        "seconds": seconds,
+        "fetch_seconds": fetched,
+        "first_rows_seconds": first_row,
+        "entries": entries,
+        "peak_mib": peak / (1 << 20),
+    }
+
+def bench_shell(results, app, repeat):
+    """Cost of starting a persistent shell session and of one round trip through it."""
+    job = adb_gui.Job(None, "bench")
+    app.close_sessions()
+    start = time.perf_counter()
+    app.shell(job, "true", SERIAL)
+    results["shell/start"] = {"seconds": time.perf_counter() - start}
+    seconds, _ = best_of(repeat, lambda: [app.shell(job, "true", SERIAL) for _ in range(20)])
+    results["shell/round-trip"] = {"seconds": seconds / 20}
+
+def bench_transfers(results, app, device_root, host_root, size_mb, repeat):
+    """Throughput of every pull and push path for one file of size_mb MiB."""
+    size = size_mb << 20
+    remote = os.path.join(device_root, "transfer.bin")
+    sandbox = f"/data/data/{PACKAGE}/transfer.bin"
+    sandbox_host = os.path.join(device_root, sandbox.lstrip("/"))
+    local = os.path.join(host_root, "transfer.bin")
+    if not os.path.exists(remote) or os.path.getsize(remote) != size:
+        with open(remote, "wb") as f:
+            block = os.urandom(1 << 20)
+            for _ in range(size_mb):
+                f.write(block)
+    shutil.copyfile(remote, sandbox_host)
+    job = adb_gui.Job(None, "bench")
+
+    def progress(done, total):
+        pass
+
+    cases = {
+        "pull/adb": lambda: app.pull_file(job, progress, SERIAL, "", False, remote, local),
+        "pull/native": lambda: app.pull_file(job, progress, SERIAL, "", True, remote, local),
+        "pull/run-as": lambda: app.pull_file(job, progress, SERIAL, PACKAGE, False, sandbox, local),
+        "pull/resumable": lambda: app.pull_resumable(job, progress, SERIAL, "", remote, local),
+        "push/adb": lambda: app.push_file(job, progress, SERIAL, "", False, local, remote + ".up"),
+        "push/native": lambda: app.push_file(job, progress, SERIAL, "", True, local, remote + ".up"),
+        "push/run-as": lambda: app.push_file(job, progress, SERIAL, PACKAGE, False, local, sandbox + ".up"),
+        "push/resumable": lambda: app.push_resumable(job, progress, SERIAL, "", local, remote + ".up"),
+    }
+    for name, run in cases.items():
+        if name.startswith("push") and not os.path.exists(local):
+            shutil.copyfile(remote, local)
+
+        def transfer():
+            if name.startswith("pull") and os.path.exists(local):
+                os.remove(local)
+            run()
+
+        seconds, _ = best_of(repeat, transfer)
+        results[f"transfer/{name}"] = {"seconds": seconds, "mb_per_s": size / 1e6 / seconds}
+        log(f"  {name}: {size / 1e6 / seconds:.1f} MB/s")
+
+def fake_adb_environment(workdir, device_root, latency, bandwidth):
+    """Put fake_adb.py on PATH as adb for this process and its children."""
+    bin_dir = os.path.join(workdir, "bin")
+    os.makedirs(bin_dir, exist_ok=True)
+    launcher = os.path.join(bin_dir, "adb")
+    fake_adb = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_adb.py")
+    with open(launcher, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{fake_adb}" "$@"\n')
+    os.chmod(launcher, 0o755)
+    os.environ.update({
+        "PATH": bin_dir + os.pathsep + os.environ.get("PATH", ""),
+        "FAKE_ADB_ROOT": device_root,
+        "FAKE_ADB_LATENCY": str(latency),
+        "FAKE_ADB_BANDWIDTH": str(bandwidth),
+        "FAKE_ADB_SERIALS": SERIAL,
+    })
+
+def compare(results, baseline, threshold):
+    """Print the change of every common benchmark; return the names that got slower than threshold."""
+    slower = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old or not old.get("seconds") or not result.get("seconds"):
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            slower.append(name)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:40} {old['seconds'] * 1000:10.2f} ms -> {result['seconds'] * 1000:10.2f} ms  x{ratio:.2f}{flag}")
+    return slower
+
+def git_revision():
+    try:
+        res = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+    except OSError:
+        return None
+    return res.stdout.strip() or None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10,1000,10000,100000", help="comma-separated directory sizes")
+    parser.add_argument("--formats", default="find,stat,ls,native", help="listing backends to measure")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added per adb command and request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="bytes/s limit of the fake device (0: none)")
+    parser.add_argument("--transfer-mb", type=int, default=32, help="size of the transfer test file (0: skip)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest counts")
+    parser.add_argument("--workdir", help="keep the synthetic trees here between runs (default: temporary)")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown counted as a regression")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    formats = args.formats.split(",")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="adb-gui-bench-")
+    device_root = os.path.join(workdir, "device")
+    host_root = os.path.join(workdir, "host")
+    sandbox = os.path.join(device_root, "data", "data", PACKAGE)
+    os.makedirs(sandbox, exist_ok=True)
+    os.makedirs(host_root, exist_ok=True)
+    fake_adb_environment(workdir, device_root, args.latency, args.bandwidth)
+    server = FakeAdbServer(("127.0.0.1", 0), "/", [SERIAL], args.latency, args.bandwidth)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app = HeadlessManager(SERIAL, adb_gui.AdbServerClient("127.0.0.1", server.server_address[1]))
+
+    results = {}
+    try:
+        bench_shell(results, app, args.repeat)
+        for size in sizes:
+            tree = os.path.join(device_root, f"tree-{size}")
+            log(f"{size} entries: generating")
+            make_tree(tree, size)
+            link = os.path.join(sandbox, f"tree-{size}")
+            if not os.path.lexists(link):
+                os.symlink(tree, link)
+            log(f"{size} entries: parsing and sorting")
+            bench_parse(results, tree, size, args.repeat)
+            for fmt in formats:
+                log(f"{size} entries: listing with {fmt}")
+                bench_listing(results, app, fmt, tree, size, args.repeat)
+            if "find" in formats:
+                bench_listing(results, app, "find", f"/data/data/{PACKAGE}/tree-{size}", size, args.repeat, PACKAGE)
+        if args.transfer_mb:
+            log(f"transfers of {args.transfer_mb} MiB")
+            bench_transfers(results, app, device_root, host_root, args.transfer_mb, args.repeat)
+    finally:
+        app.close_sessions()
+        server.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "settings": vars(args),
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    elif not args.compare:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.threshold)
+        if slower:
+            print(f"{len(slower)} benchmarks slower by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
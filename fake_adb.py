@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Stand-in for the adb command line tool, for running main.py or benchmark.py without a device.
+
+Device paths are host paths, except that /data/data/ maps to $FAKE_ADB_ROOT/data/data/
+so that app sandboxes can live in a scratch directory; run-as itself is ignored.
+Understands devices, start-server, shell (interactive or with a command), exec-out, exec-in, pull and
+push. Put a script named adb that runs it first on PATH:
+
+    printf '#!/bin/sh\\nexec python3 %s "$@"\\n' "$PWD/fake_adb.py" > /tmp/bin/adb && chmod +x /tmp/bin/adb
+    FAKE_ADB_ROOT=/tmp/device FAKE_ADB_LATENCY=0.02 PATH=/tmp/bin:$PATH python3 main.py
+
+FAKE_ADB_LATENCY adds seconds of delay to every invocation and every command sent to
+an interactive shell; FAKE_ADB_BANDWIDTH caps data in either direction at bytes/s;
+FAKE_ADB_SERIALS is a comma-separated list of device serials.
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from fake_adb_server import CHUNK, Throttle
+
+ROOT = os.environ.get("FAKE_ADB_ROOT", "/tmp/fake-adb")
+LATENCY = float(os.environ.get("FAKE_ADB_LATENCY") or 0)
+BANDWIDTH = float(os.environ.get("FAKE_ADB_BANDWIDTH") or 0)
+SERIALS = (os.environ.get("FAKE_ADB_SERIALS") or "fake-device").split(",")
+
+def device_path(text):
+    """Rewrite app sandbox paths in a path or command line into the scratch root."""
+    return text.replace("/data/data/", ROOT.rstrip("/") + "/data/data/")
+
+def device_paths(data):
+    return data.replace(b"/data/data/", os.fsencode(ROOT.rstrip("/") + "/data/data/"))
+
+def strip_run_as(command):
+    return re.sub(r"^run-as\s+\S+\s+", "", command)
+
+def pump(src, dst, throttle, commands=False, close=True):
+    """Copy a binary stream to another until EOF. With commands set, the data are command
+    lines for a shell: each chunk is delayed by LATENCY and gets device_paths applied."""
+    try:
+        for data in iter(lambda: src.read1(CHUNK), b""):
+            throttle(len(data))
+            if commands:
+                time.sleep(LATENCY)
+                data = device_paths(data)
+            dst.write(data)
+            dst.flush()
+    except BrokenPipeError:
+        pass
+    if close:
+        dst.close()
+
+def run_shell(command=None, stdin=False):
+    """Run command (None: an interactive sh fed from stdin) with throttled stdout."""
+    if command is None:
+        proc = subprocess.Popen(["sh"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        threading.Thread(
+            target=pump, args=(sys.stdin.buffer, proc.stdin, Throttle(BANDWIDTH), True), daemon=True
+        ).start()
+    elif stdin:
+        proc = subprocess.Popen(["sh", "-c", device_path(command)], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        threading.Thread(target=pump, args=(sys.stdin.buffer, proc.stdin, Throttle(BANDWIDTH)), daemon=True).start()
+    else:
+        proc = subprocess.Popen(["sh", "-c", device_path(command)], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+    pump(proc.stdout, sys.stdout.buffer, Throttle(BANDWIDTH), close=False)
+    return proc.wait()
+
+def copy(src, dst):
+    """Copy a file or tree like adb pull/push: into dst if that is a directory."""
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src.rstrip("/")))
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, symlinks=True, dirs_exist_ok=True, copy_function=copy)
+        return
+    throttle = Throttle(BANDWIDTH)
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        for data in iter(lambda: fin.read(CHUNK), b""):
+            throttle(len(data))
+            fout.write(data)
+
+def main(args):
+    while args[:1] in (["-s"], ["-t"], ["-H"], ["-P"]):
+        args = args[2:]
+    time.sleep(LATENCY)
+    command, args = (args[0], args[1:]) if args else ("", [])
+    if command == "devices":
+        print("List of devices attached")
+        for serial in SERIALS:
+            print(f"{serial}\tdevice")
+        return 0
+    if command in ("start-server", "kill-server"):
+        return 0
+    if command == "shell":
+        line = strip_run_as(" ".join(args))
+        return run_shell(None if line in ("", "sh") else line)
+    if command in ("exec-out", "exec-in"):
+        return run_shell(strip_run_as(" ".join(args)), stdin=command == "exec-in")
+    if command in ("pull", "push") and len(args) >= 2:
+        try:
+            copy(device_path(args[-2]), device_path(args[-1]))
+        except OSError as e:
+            print(f"adb: error: {e}", file=sys.stderr)
+            return 1
+        print(f"{args[-2]}: 1 file {command}ed.")
+        return 0
+    print(f"fake adb: unsupported command {' '.join([command] + args)}", file=sys.stderr)
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
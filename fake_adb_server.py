@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Stand-in for the adb server (host:5037 protocol) backed by a local directory.
+
+Serves host:version, host:devices, host:track-devices, host:transport, the sync protocol
+(LIST, STAT, RECV, SEND) and shell:/exec: (run with `sh -c` inside the root directory), which is
+enough to exercise AdbServerClient without a real device:
+
+    python3 fake_adb_server.py --root /tmp/device --port 5038
+    ADB_SERVER_SOCKET=tcp:127.0.0.1:5038 python3 main.py
+
+--latency delays every request and --bandwidth caps file and shell data rates, to mimic
+a slow cable or adb over Wi-Fi.
+"""
+
+import argparse
+import os
+import socketserver
+import stat
+import struct
+import subprocess
+import threading
+import time
+
+CHUNK = 64 * 1024
+
+class Throttle:
+    """Rate limiter: call it with each byte count passed on and it sleeps as needed to
+    keep the average at most bandwidth bytes/s (0: no limit)."""
+
+    def __init__(self, bandwidth=0):
+        self.bandwidth = bandwidth
+        self.started = time.monotonic()
+        self.done = 0
+
+    def __call__(self, n):
+        if self.bandwidth:
+            self.done += n
+            delay = self.done / self.bandwidth - (time.monotonic() - self.started)
+            if delay > 0:
+                time.sleep(delay)
+
+class FakeAdbHandler(socketserver.BaseRequestHandler):
+    def recv_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                raise EOFError
+            buf += chunk
+        return bytes(buf)
+
+    def okay(self, payload=None):
+        data = b"OKAY"
+        if payload is not None:
+            data += b"%04x" % len(payload) + payload
+        self.request.sendall(data)
+
+    def fail(self, message):
+        message = message.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(message) + message)
+
+    def local_path(self, device_path):
+        """Map an absolute device path into the served root."""
+        path = os.path.normpath("/" + device_path.lstrip("/"))
+        return os.path.join(self.server.root, path.lstrip("/"))
+
+    def handle(self):
+        self.throttle = Throttle(self.server.bandwidth)
+        time.sleep(self.server.latency)
+        try:
+            while True:
+                service = self.recv_exact(int(self.recv_exact(4), 16)).decode()
+                if service == "host:version":
+                    self.okay(b"0029")
+                    return
+                elif service in ("host:devices", "host:devices-l"):
+                    self.okay(self.server.device_list())
+                    return
+                elif service == "host:track-devices":
+                    self.okay()
+                    self.track_devices()
+                    return
+                elif service == "host:transport-any" or service.startswith("host:transport:"):
+                    serial = service.split(":", 2)[2] if service.count(":") == 2 else self.server.serials[0]
+                    if serial not in self.server.serials:
+                        self.fail(f"device '{serial}' not found")
+                        return
+                    self.okay()
+                elif service == "sync:":
+                    self.okay()
+                    self.sync()
+                    return
+                elif service.startswith(("shell:", "exec:")):
+                    self.okay()
+                    self.shell(service.split(":", 1)[1])
+                    return
+                else:
+                    self.fail(f"unknown host service '{service}'")
+                    return
+        except (EOFError, ConnectionError):
+            pass
+
+    def track_devices(self):
+        """Send the device list now and again whenever set_devices() changes it."""
+        with self.server.changed:
+            while True:
+                listing = self.server.device_list()
+                self.request.sendall(b"%04x" % len(listing) + listing)
+                self.server.changed.wait()
+
+    def shell(self, command):
+        proc = subprocess.Popen(
+            ["sh", "-c", command], cwd=self.server.root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+        for chunk in iter(lambda: proc.stdout.read1(CHUNK), b""):
+            self.throttle(len(chunk))
+            self.request.sendall(chunk)
+        proc.wait()
+
+    def sync(self):
+        while True:
+            ident, length = struct.unpack("<4sI", self.recv_exact(8))
+            if ident == b"QUIT":
+                return
+            payload = self.recv_exact(length).decode(errors="surrogateescape")
+            if ident == b"LIST":
+                self.sync_list(payload)
+            elif ident == b"STAT":
+                self.sync_stat(payload)
+            elif ident == b"RECV":
+                self.sync_recv(payload)
+            elif ident == b"SEND":
+                self.sync_send(payload)
+            else:
+                return
+
+    def sync_list(self, path):
+        try:
+            entries = list(os.scandir(self.local_path(path)))
+        except OSError:
+            entries = []
+        for entry in entries:
+            st = entry.stat(follow_symlinks=False)
+            name = entry.name.encode(errors="surrogateescape")
+            self.request.sendall(
+                struct.pack("<4s4I", b"DENT", st.st_mode, st.st_size & 0xFFFFFFFF, int(st.st_mtime), len(name))
+                + name
+            )
+        self.request.sendall(struct.pack("<4s4I", b"DONE", 0, 0, 0, 0))
+
+    def sync_stat(self, path):
+        try:
+            st = os.stat(self.local_path(path))
+            values = (st.st_mode, st.st_size & 0xFFFFFFFF, int(st.st_mtime))
+        except OSError:
+            values = (0, 0, 0)
+        self.request.sendall(struct.pack("<4s3I", b"STAT", *values))
+
+    def sync_recv(self, path):
+        try:
+            f = open(self.local_path(path), "rb")
+        except OSError as e:
+            message = e.strerror.encode()
+            self.request.sendall(struct.pack("<4sI", b"FAIL", len(message)) + message)
+            return
+        with f:
+            for data in iter(lambda: f.read(CHUNK), b""):
+                self.throttle(len(data))
+                self.request.sendall(struct.pack("<4sI", b"DATA", len(data)) + data)
+        self.request.sendall(struct.pack("<4sI", b"DONE", 0))
+
+    def sync_send(self, spec):
+        path, _, mode = spec.rpartition(",")
+        target = self.local_path(path)
+        error = None
+        try:
+            f = open(target, "wb")
+        except OSError as e:
+            f, error = None, e.strerror
+        while True:
+            ident, length = struct.unpack("<4sI", self.recv_exact(8))
+            if ident == b"DONE":
+                mtime = length
+                break
+            data = self.recv_exact(length)
+            self.throttle(length)
+            if f:
+                f.write(data)
+        if f:
+            f.close()
+            os.chmod(target, stat.S_IMODE(int(mode or "420")))
+            os.utime(target, (mtime, mtime))
+            self.request.sendall(struct.pack("<4sI", b"OKAY", 0))
+        else:
+            message = error.encode()
+            self.request.sendall(struct.pack("<4sI", b"FAIL", len(message)) + message)
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, root, serials, latency=0.0, bandwidth=0):
+        super().__init__(address, FakeAdbHandler)
+        self.root = os.path.abspath(root)
+        self.devices = [(serial, "device") for serial in serials]  # (serial, state) pairs
+        self.changed = threading.Condition()
+        self.latency = latency  # seconds added to every request
+        self.bandwidth = bandwidth  # bytes/s per connection, 0 for no limit
+
+    @property
+    def serials(self):
+        return [serial for serial, state in self.devices if state == "device"]
+
+    def device_list(self):
+        return "".join(f"{serial}\t{state}\n" for serial, state in self.devices).encode()
+
+    def set_devices(self, devices):
+        """Replace the (serial, state) pairs reported, e.g. to simulate unplugging a device."""
+        with self.changed:
+            self.devices = list(devices)
+            self.changed.notify_all()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", required=True, help="local directory served as the device filesystem")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5038)
+    parser.add_argument("--serial", action="append", help="device serial to report (repeatable)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--bandwidth", type=float, default=0, help="bytes/s per connection (0: unlimited)")
+    args = parser.parse_args()
+    serials = args.serial or ["fake-device"]
+    with FakeAdbServer((args.host, args.port), args.root, serials, args.latency, args.bandwidth) as server:
+        print(f"fake adb server on {args.host}:{server.server_address[1]} serving {server.root}")
+        server.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,1588 @@
 #!/usr/bin/env python3
 
-from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import bisect
+import queue
+import re
+import sqlite3
 import subprocess
+import tarfile
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog, simpledialog
 import tkinter.font as tkfont
+import calendar
+import codecs
+import hashlib
+import json
 import os
+import shlex
+import shutil
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# Refuse absolute paths, links out of the target and device files in downloaded archives
+TAR_EXTRACT_ARGS = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+STREAM_CHUNK = 256 * 1024  # bytes per write when piping a file into the device
+PROGRESS_POLL_SECONDS = 0.2  # how often the local file of a running adb pull is measured
+RENDER_CHUNK = 500  # Treeview rows inserted per event-loop turn
+LISTING_BATCH_SECONDS = 0.1  # how often rows of a listing still arriving are pushed to the view
+RESUME_MIN_SIZE = 64 * 1024 * 1024  # files at least this large are transferred in resumable chunks
+RESUME_CHUNK = 8 * 1024 * 1024  # bytes per chunk of a resumable transfer
+RESUME_ATTEMPTS = 5  # times an interrupted resumable transfer is restarted before it fails
+PREVIEW_PAGE = 64 * 1024  # bytes fetched at a time by the file preview
+PREVIEW_PAGES = 8  # pages the preview holds; scrolling or following drops the farthest ones
+TRACK_RETRY_SECONDS = 2  # wait before reconnecting to the adb server's device tracker
+DEVICE_LOST_GRACE = 5  # seconds a transfer may have failed before its device is reported gone and still be paused
+
+SIZE_UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40, "P": 1 << 50, "E": 1 << 60}
+
+# Treeview column id -> (heading id, heading label)
+COLUMNS = {
+    "1": ("Name", "Name"),
+    "2": ("Size", "Size"),
+    "3": ("Owner", "Owner"),
+    "4": ("Group", "Group"),
+    "5": ("Date", "Modified"),
+    "6": ("Permissions", "Permissions"),
+}
+
+def parse_size(text):
+    """Convert an ls -h size such as "512", "1.2K" or "3.4G" to bytes (-1 if unknown)."""
+    if not text:
+        return -1
+    mult = SIZE_UNITS.get(text[-1].upper())
+    try:
+        if mult:
+            return int(float(text[:-1]) * mult)
+        return int(text)
+    except ValueError:
+        return -1
+
+def format_size(size):
+    """Format a byte count the way ls -h does ("512", "1.2K", "3.4G")."""
+    if size < 1024:
+        return str(size)
+    for unit in "KMGTPE":
+        size /= 1024
+        if size < 1024 or unit == "E":
+            return f"{size:.1f}{unit}" if size < 10 else f"{size:.0f}{unit}"
+
+def parse_date(text):
+    """Convert an ls date "YYYY-MM-DD HH:MM" to epoch seconds (-1 if unknown).
+
+    Device local time is treated as UTC, which keeps the ordering intact.
+    """
+    try:
+        return calendar.timegm((int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                                int(text[11:13]), int(text[14:16]), 0))
+    except (ValueError, IndexError):
+        return -1
+
+class FileEntry:
+    """One listing row: the Treeview values plus precomputed sort keys."""
+
+    __slots__ = ("values", "name_key", "rank", "size", "mtime")
+
+    def __init__(self, name, type_or_size, owner, group, date, perms, size=None, mtime=None):
+        self.values = (name, type_or_size, owner, group, date, perms)
+        self.name_key = name.lower()
+        self.rank = 0 if type_or_size == "dir" else 1
+        if size is None:
+            size = -1 if type_or_size == "dir" else parse_size(type_or_size)
+        self.size = size
+        self.mtime = parse_date(date) if mtime is None else mtime
+
+    @classmethod
+    def from_stat(cls, name, mode, size, mtime, owner="", group=""):
+        """Build an entry from a numeric st_mode (sync protocol)."""
+        return cls.from_fields(name, stat.filemode(mode), owner, group, size, mtime)
+
+    @classmethod
+    def from_fields(cls, name, perms, owner, group, size, mtime, target=""):
+        """Build an entry from exact values (sync protocol / machine-readable listings)."""
+        if perms.startswith("d"):
+            type_or_size = "dir"
+        elif perms.startswith("l"):
+            type_or_size = "link"
+            if target:
+                name = f"{name} -> {target}"
+        else:
+            type_or_size = format_size(size)
+        date = time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
+        return cls(name, type_or_size, owner, group, date, perms, size, mtime)
+
+SORT_KEYS = {
+    # Name: directories first, then files; within each group alphabetically (case-insensitive)
+    "1": lambda e: (e.rank, e.name_key),
+    "2": lambda e: (e.rank, e.size),
+    "3": lambda e: e.values[2].lower(),
+    "4": lambda e: e.values[3].lower(),
+    "5": lambda e: e.mtime,
+    "6": lambda e: e.values[5],
+}
+
+def sort_entries(entries, sort_spec):
+    """Return entries sorted by sort_spec, a list of (column, ascending) in priority order.
+
+    Relies on the stability of list.sort: the least significant column is sorted first.
+    """
+    entries = list(entries)
+    for col, asc in reversed(sort_spec):
+        entries.sort(key=SORT_KEYS[col], reverse=not asc)
+    return entries
+
+class LsParser:
+    """Incremental `ls -lah` parser: feed() it raw output chunks, get FileEntry rows back."""
+
+    def __init__(self):
+        self.total = ""  # the "total 24K" line
+        self.amount = 0  # entries seen, without . and ..
+        self._tail = b""  # incomplete last line
+
+    def feed(self, chunk):
+        lines = (self._tail + chunk).split(b"\n")
+        self._tail = lines.pop()
+        return self.parse_lines(line.decode(errors="replace") for line in lines)
+
+    def close(self):
+        tail, self._tail = self._tail, b""
+        return self.parse_lines([tail.decode(errors="replace")])
+
+    def parse_lines(self, lines):
+        entries = []
+        for line in lines:
+            entry = self.parse_line(line)
+            if entry is not None:
+                entries.append(entry)
+        return entries
+
+    def parse_line(self, line):
+        line = line.rstrip("\r")
+        if not line.strip():
+            return None
+        # ls prints a lone "?" in place of an unknown date and time
+        line = line.replace("                ?", " ????-??-?? ??:??")
+        parts = line.split(None, 7)
+        if len(parts) < 6:
+            self.total = line
+            return None
+        perms = parts[0]
+        owner = parts[2] if len(parts) > 2 else ""
+        group = parts[3] if len(parts) > 3 else ""
+        date = " ".join(parts[5:7]) if len(parts) > 6 else ""
+        name = parts[-1]
+        if perms.startswith("d"):
+            type_or_size = "dir"
+        else:
+            # parts[4] is size when using ls -lh (e.g., "1.2K", "512")
+            type_or_size = parts[4] if len(parts) > 4 else "file"
+        if name not in (".", ".."):
+            self.amount += 1
+        return FileEntry(name, type_or_size, owner, group, date, perms)
+
+class FindParser:
+    """Incremental parser for `find -printf` listings with NUL-terminated fields.
+
+    Each record is FIELDS fields: mode string, owner, group, size, mtime, link target
+    and name. NUL cannot occur in file names, so any name parses unambiguously.
+    """
+
+    FIELDS = 7
+    SEP = b"\0"
+
+    def __init__(self):
+        self.amount = 0
+        self._size = 0
+        self._tail = b""
+        self._fields = []
+
+    @property
+    def total(self):
+        return f"total {format_size(self._size)}"
+
+    def feed(self, chunk):
+        data = self._tail + chunk
+        cut = data.rfind(self.SEP) + 1
+        self._tail = data[cut:]
+        fields = self._fields
+        fields.extend(data[:cut].decode(errors="replace").split(self.SEP.decode())[:-1])
+        n = len(fields) - len(fields) % self.FIELDS
+        entries = []
+        parse_record = self.parse_record
+        for i in range(0, n, self.FIELDS):
+            entry = parse_record(fields[i:i + self.FIELDS])
+            if entry is not None:
+                entries.append(entry)
+        del fields[:n]
+        return entries
+
+    def close(self):
+        return []
+
+    def parse_record(self, record):
+        perms, owner, group, size, mtime, target, name = record
+        try:
+            size, mtime = int(size), int(float(mtime))
+        except ValueError:
+            return None
+        self.amount += 1
+        self._size += size
+        return FileEntry.from_fields(name, perms, owner, group, size, mtime, target)
+
+class StatParser(FindParser):
+    """Incremental parser for `stat -c` listings.
+
+    NUL cannot be passed on a command line, so fields end with the ASCII unit
+    separator instead. The name is the full path (%n) and the link target comes
+    from %N ("'path' -> 'target'").
+    """
+
+    SEP = b"\x1f"
+
+    def parse_record(self, record):
+        perms, owner, group, size, mtime, quoted, path = record
+        # stat ends every record with a newline, which lands in front of the next one
+        perms = perms.lstrip("\n")
+        target = ""
+        if perms.startswith("l") and " -> " in quoted:
+            target = quoted.split(" -> ", 1)[1].strip("'\"`")
+        return super().parse_record([perms, owner, group, size, mtime, target, path.rsplit("/", 1)[-1]])
+
+FIND_PRINTF = "%M\\0%u\\0%g\\0%s\\0%T@\\0%l\\0%f\\0"
+STAT_FORMAT = "\x1f".join(["%A", "%U", "%G", "%s", "%Y", "%N", "%n"]) + "\x1f"
+
+# Listing backends, best first: (probe command, listing command for a quoted dir path, parser)
+LISTING_FORMATS = {
+    "find": (
+        f"find / -maxdepth 0 -printf '{FIND_PRINTF}'",
+        f"find {{path}} -mindepth 1 -maxdepth 1 -printf '{FIND_PRINTF}'",
+        FindParser,
+    ),
+    "stat": (
+        f"stat -c '{STAT_FORMAT}' /",
+        f"find {{path}} -mindepth 1 -maxdepth 1 -exec stat -c '{STAT_FORMAT}' {{{{}}}} +",
+        StatParser,
+    ),
+    "ls": (None, "ls -lah {path}", LsParser),
+}
+
+def listing_command(fmt, path):
+    """Return the shell command listing path in the given LISTING_FORMATS format."""
+    if fmt != "ls":
+        # a trailing slash makes find descend into symlinked directories such as /sdcard
+        path = path.rstrip("/") + "/"
+    return LISTING_FORMATS[fmt][1].format(path=shlex.quote(path))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # histogram bounds, seconds
+STATS_WINDOW = 1000  # latest samples kept per (kind, device)
+STATS_REFRESH_MS = 1000  # how often an open stats window is redrawn
+SPARK = "▁▂▃▄▅▆▇█"
+
+def command_kind(cmd):
+    """Return (kind, device) of an adb command line, e.g. ("exec-out dd", "emulator-5554")."""
+    args = list(cmd[1:])
+    device = ""
+    if args[:1] == ["-s"]:
+        device, args = args[1], args[2:]
+    if not args:
+        return cmd[0], device
+    kind = args[0]
+    if kind in ("shell", "exec-out", "exec-in"):
+        words = " ".join(args[1:]).split()
+        if words[:1] == ["run-as"]:
+            words = words[2:]
+        if words:
+            kind += " " + words[0]
+    return kind, device
+
+class Stats:
+    """Rolling timings of adb invocations and listing phases per (kind, device); thread-safe.
+
+    Each sample is (seconds, bytes, returncode). While a trace file is open every sample is
+    also appended to it as a JSON line.
+    """
+
+    def __init__(self, window=STATS_WINDOW):
+        self.window = window
+        self.samples = {}  # (kind, device) -> deque of samples
+        self.trace = None
+        self.trace_path = None
+        self.lock = threading.Lock()
+
+    def record(self, kind, device, seconds, nbytes=0, returncode=None, **details):
+        with self.lock:
+            samples = self.samples.get((kind, device))
+            if samples is None:
+                samples = self.samples[(kind, device)] = deque(maxlen=self.window)
+            samples.append((seconds, nbytes, returncode))
+            if self.trace:
+                self.trace.write(json.dumps(dict(
+                    time=round(time.time(), 3), kind=kind, device=device, seconds=round(seconds, 6),
+                    bytes=nbytes, returncode=returncode, **details,
+                )) + "\n")
+
+    def summary(self):
+        """Return (kind, device, count, errors, p50, p90, max, bytes, histogram) rows; the histogram
+        counts samples per LATENCY_BUCKETS bucket, plus one for slower ones."""
+        with self.lock:
+            items = sorted((key, list(samples)) for key, samples in self.samples.items())
+        rows = []
+        for (kind, device), samples in items:
+            times = sorted(seconds for seconds, _, _ in samples)
+            n = len(times)
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            for seconds in times:
+                histogram[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            rows.append((
+                kind, device, n, sum(1 for _, _, rc in samples if rc not in (None, 0)),
+                times[n // 2], times[n * 9 // 10], times[-1], sum(nbytes for _, nbytes, _ in samples), histogram,
+            ))
+        return rows
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+
+    def start_trace(self, path):
+        """Append every further sample to path as JSON lines."""
+        trace = open(path, "a", buffering=1)
+        with self.lock:
+            old, self.trace, self.trace_path = self.trace, trace, path
+        if old:
+            old.close()
+
+    def stop_trace(self):
+        with self.lock:
+            trace, self.trace, self.trace_path = self.trace, None, None
+        if trace:
+            trace.close()
+
+STATS = Stats()
+
+def format_latency(seconds):
+    return f"{seconds * 1000:.1f} ms" if seconds < 1 else f"{seconds:.2f} s"
+
+def sparkline(counts):
+    top = max(counts) or 1
+    return "".join(SPARK[(len(SPARK) - 1) * c // top] if c else " " for c in counts)
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been cancelled."""
+
+class AdbError(Exception):
+    """An adb command finished with a non-zero exit status."""
+
+class Job:
+    """A unit of background work; cancel() may be called from any thread."""
+
+    def __init__(self, executor, name):
+        self.executor = executor
+        self.name = name
+        self.cancelled = False
+        self._procs = set()
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        self.cancelled = True
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(self.name)
+
+    def popen(self, cmd, **kwargs):
+        """Start a process that is killed if the job is cancelled; pair with release()."""
+        self.check()
+        proc = subprocess.Popen(cmd, **kwargs)
+        proc.started = time.perf_counter()
+        self.track(proc)
+        return proc
+
+    def track(self, proc):
+        """Kill proc if the job is cancelled before release(proc)."""
+        with self._lock:
+            self._procs.add(proc)
+        if self.cancelled:
+            proc.kill()
+
+    def release(self, proc, nbytes=0):
+        """Stop tracking proc; for processes from popen() its run time, nbytes and exit status
+        are recorded in STATS."""
+        with self._lock:
+            self._procs.discard(proc)
+        started = getattr(proc, "started", None)
+        if started is not None:
+            kind, device = command_kind(proc.args)
+            STATS.record(kind, device, time.perf_counter() - started, nbytes, proc.poll())
+
+    def run(self, cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, input=None):
+        """Like subprocess.run, but cancellable."""
+        stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+        proc = self.popen(cmd, stdin=stdin, stdout=stdout, stderr=stderr, text=text)
+        out = err = ""
+        try:
+            out, err = proc.communicate(input)
+        finally:
+            self.release(proc, len(out or "") + len(err or ""))
+        self.check()
+        return subprocess.CompletedProcess(cmd, proc.returncode, out, err)
+
+    def post(self, callback, *args):
+        """Run callback(*args) on the Tk main thread."""
+        self.executor.post(callback, *args)
+
+class Executor:
+    """Runs jobs on a worker thread pool and delivers their results to the Tk main thread.
+
+    Results are handed over through a queue that is drained from root.after(), so the
+    done/error callbacks may touch widgets freely.
+    """
+
+    def __init__(self, root, max_workers=32, poll_ms=30):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="adb")
+        self.jobs = set()  # in-flight jobs, only touched on the main thread
+        self.on_change = None  # called with the in-flight job set whenever it changes
+        self._queue = queue.Queue()
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, name, fn, on_done=None, on_error=None):
+        """Run fn(job) in the pool; on_done(result) or on_error(exc) run on the main thread."""
+        job = Job(self, name)
+        self.jobs.add(job)
+        self._changed()
+
+        def work():
+            try:
+                result = fn(job)
+                job.check()
+            except BaseException as e:
+                self.post(self._finish, job, on_error, e)
+            else:
+                self.post(self._finish, job, on_done, result)
+
+        self.pool.submit(work)
+        return job
+
+    def post(self, callback, *args):
+        self._queue.put((callback, args))
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            job.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self.root.after_cancel(self._after_id)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, job, callback, value):
+        self.jobs.discard(job)
+        self._changed()
+        if callback is not None:
+            callback(value)
+        elif isinstance(value, BaseException) and not isinstance(value, JobCancelled):
+            print(f"{job.name}: {value}")
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self.jobs)
+
+    def _poll(self):
+        try:
+            while True:
+                callback, args = self._queue.get_nowait()
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print(f"callback error: {e}")
+        except queue.Empty:
+            pass
+        self._after_id = self.root.after(self.poll_ms, self._poll)
+
+class CancelWatch:
+    """Stands in for a session's process in Job.track(): cancelling marks the running command
+    as cancelled and kills the process only if the command has not finished after grace seconds."""
+
+    def __init__(self, proc, grace):
+        self.proc = proc
+        self.cancelled = False
+        self._timer = threading.Timer(grace, self._expire)
+        self._timer.daemon = True
+
+    def kill(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self._timer.start()
+
+    def disarm(self):
+        self._timer.cancel()
+
+    def _expire(self):
+        try:
+            self.proc.kill()
+        except OSError:
+            pass
+
+class ShellSession:
+    """A long-lived shell process (e.g. `adb shell` or `adb shell run-as <pkg> sh`).
+
+    Commands run one at a time. Each is followed by a unique marker line on stderr and
+    one carrying its exit status on stdout, so the output of consecutive commands
+    never mixes. A dead process is restarted on the next command. Any
+    command list that starts a POSIX shell reading stdin works, e.g. ["sh"] for tests.
+    """
+
+    CHUNK = 64 * 1024  # bytes read from stdout per system call
+    CANCEL_GRACE = 5  # seconds a cancelled command may run on before the process is killed
+
+    def __init__(self, cmd):
+        self.cmd = cmd
+        self.device = command_kind(cmd)[1]
+        self.proc = None
+        self.merged_stderr = False  # old adbd without shell protocol v2 merges the streams
+        self._lock = threading.Lock()
+        self._token = uuid.uuid4().hex
+        self._seq = 0
+        self._stderr_lines = None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            self.cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0
+        )
+        self._stderr_lines = queue.Queue()
+        threading.Thread(target=self._read_stderr, args=(self.proc, self._stderr_lines), daemon=True).start()
+
+    def close(self):
+        proc, self.proc = self.proc, None
+        if proc and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    @staticmethod
+    def _read_stderr(proc, lines):
+        for line in iter(proc.stderr.readline, b""):
+            lines.put(line)
+        lines.put(None)
+
+    def run(self, command, job=None, on_output=None, kind=None):
+        """Run command and return a CompletedProcess with text stdout/stderr.
+
+        kind names the command in STATS (default: "shell" and its first word).
+
+        on_output(chunk), if given, receives raw stdout bytes as they arrive instead of them
+        being collected into the result's stdout. When the
+        process turns out to be dead before any output was produced, the command is
+        retried once on a fresh process.
+
+        Cancelling job lets the command finish with its output discarded, so the process
+        survives; only a command still running CANCEL_GRACE seconds later gets it killed.
+        """
+        with self._lock:
+            for attempt in (0, 1):
+                if job:
+                    job.check()
+                if not self.alive():
+                    self.start()
+                try:
+                    return self._run(command, job, on_output, kind)
+                except (BrokenPipeError, EOFError) as e:
+                    self.close()
+                    if job:
+                        job.check()
+                    if attempt or getattr(e, "partial", False):
+                        raise AdbError(f"shell session died: {' '.join(self.cmd)}") from e
+
+    def _run(self, command, job, on_output, kind):
+        self._seq += 1
+        mark = f"__ADBGUI_{self._token}_{self._seq}__".encode()
+        err_mark = mark + b"E"
+        proc = self.proc
+        proc.stdin.write(
+            b"{ " + command.encode() + b"\n} </dev/null\n"
+            b"__adbgui_rc=$?\n"
+            b"printf '\\n%s\\n' " + err_mark + b" >&2\n"
+            b"printf '\\n%s %s\\n' " + mark + b' "$__adbgui_rc"\n'
+        )
+        proc.stdin.flush()
+        started = time.perf_counter()
+        nbytes = 0
+        watch = CancelWatch(proc, self.CANCEL_GRACE)
+        if job:
+            job.track(watch)
+        try:
+            out = []
+            buf = b""
+            received = False
+            returncode = None
+
+            def emit(chunk):
+                nonlocal nbytes
+                if chunk and not watch.cancelled:
+                    nbytes += len(chunk)
+                    if on_output:
+                        on_output(chunk)
+                    else:
+                        out.append(chunk)
+
+            while returncode is None:
+                data = proc.stdout.read(self.CHUNK)
+                if not data:
+                    e = EOFError()
+                    e.partial = received
+                    raise e
+                received = True
+                buf += data
+                while True:
+                    i = buf.find(mark)
+                    end = buf.find(b"\n", i) if i >= 0 else -1
+                    if end < 0:
+                        # hold back what may be a marker line still arriving, from the newline
+                        # printed in front of it
+                        if i >= 0:
+                            cut = max(i - 1, 0)
+                        else:
+                            cut = buf.rfind(b"\n", max(len(buf) - len(mark) - 1, 0))
+                            if cut < 0 or not (b"\n" + mark).startswith(buf[cut:]):
+                                cut = len(buf)
+                        emit(buf[:cut])
+                        buf = buf[cut:]
+                        break
+                    emit(buf[:i - 1] if buf[i - 1:i] == b"\n" else buf[:i])
+                    line, buf = buf[i:end], buf[end + 1:]
+                    if line == err_mark:
+                        # the stderr marker showed up on stdout
+                        self.merged_stderr = True
+                        continue
+                    returncode = int(line[len(mark) + 1:].strip() or 0)
+                    break
+            err = []
+            if not self.merged_stderr:
+                while True:
+                    try:
+                        line = self._stderr_lines.get(timeout=5)
+                    except queue.Empty:
+                        break
+                    if line is None or line.rstrip(b"\n") == err_mark:
+                        break
+                    err.append(line)
+        finally:
+            watch.disarm()
+            if job:
+                job.release(watch)
+        if job:
+            job.check()
+        kind = kind or f"shell {command.split(None, 1)[0]}"
+        STATS.record(kind, self.device, time.perf_counter() - started, nbytes, returncode)
+        return subprocess.CompletedProcess(
+            command,
+            returncode,
+            b"".join(out).decode(errors="replace"),
+            b"".join(err)[:-1].decode(errors="replace"),
+        )
+
+class AdbConnection:
+    """One socket to the adb server, speaking the host and sync protocols."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.kind = "connect"  # what it is used for, in STATS
+        self.device = ""
+        self.opened = time.perf_counter()
+        self.nbytes = 0  # payload bytes sent and received
+
+    def kill(self):
+        """Abort blocking I/O from another thread (lets Job.cancel() stop a transfer)."""
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def recv_exact(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.sock.recv(n - len(buf))
+            if not chunk:
+                raise AdbError("adb server closed the connection")
+            buf += chunk
+        self.nbytes += n
+        return bytes(buf)
+
+    def read_hex_string(self):
+        return self.recv_exact(int(self.recv_exact(4), 16)).decode(errors="replace")
+
+    def request(self, service):
+        """Send a host request and wait for OKAY (raises AdbError on FAIL)."""
+        data = service.encode()
+        self.sock.sendall(b"%04x" % len(data) + data)
+        status = self.recv_exact(4)
+        if status == b"FAIL":
+            raise AdbError(self.read_hex_string())
+        if status != b"OKAY":
+            raise AdbError(f"unexpected adb server reply {status!r}")
+
+    def sync_send(self, ident, data=b""):
+        self.sock.sendall(ident + struct.pack("<I", len(data)) + data)
+        self.nbytes += len(data)
+
+    def sync_header(self):
+        header = self.recv_exact(8)
+        return header[:4], struct.unpack("<I", header[4:])[0]
+
+    def sync_fail(self, length):
+        raise AdbError(self.recv_exact(length).decode(errors="replace"))
+
+class AdbServerClient:
+    """Talks to the local adb server directly instead of spawning the adb binary.
+
+    Covers host:devices / host:track-devices / host:transport and the sync protocol
+    (LIST, STAT, RECV, SEND).
+    The server address follows adb's own ADB_SERVER_SOCKET / ANDROID_ADB_SERVER_PORT.
+    Sync v1 reports sizes and mtimes as 32-bit values.
+    """
+
+    CHUNK = 64 * 1024  # maximum sync DATA payload
+
+    def __init__(self, host=None, port=None):
+        spec = os.environ.get("ADB_SERVER_SOCKET", "")
+        if spec.startswith("tcp:"):
+            default_host, _, default_port = spec[4:].rpartition(":")
+        else:
+            default_host, default_port = "127.0.0.1", os.environ.get("ANDROID_ADB_SERVER_PORT", "5037")
+        self.host = host or default_host or "127.0.0.1"
+        self.port = int(port or default_port)
+
+    def connect(self, timeout=10):
+        return AdbConnection(socket.create_connection((self.host, self.port), timeout=timeout))
+
+    def devices(self):
+        """Return [(serial, state), ...] as reported by host:devices."""
+        with self.connect() as conn:
+            conn.request("host:devices")
+            lines = conn.read_hex_string().splitlines()
+        return [tuple(line.split("\t", 1)) for line in lines if "\t" in line]
+
+    def open_sync(self, serial, job=None, kind="sync"):
+        conn = self.connect()
+        conn.kind, conn.device = kind, serial or ""
+        if job:
+            job.track(conn)
+        try:
+            conn.request(f"host:transport:{serial}" if serial else "host:transport-any")
+            conn.request("sync:")
+        except BaseException:
+            self._release(conn, job)
+            raise
+        return conn
+
+    @staticmethod
+    def _release(conn, job):
+        if job:
+            job.release(conn)
+        conn.close()
+        # called from finally blocks: an exception on its way out means the operation failed
+        failed = sys.exc_info()[0] is not None
+        STATS.record(conn.kind, conn.device, time.perf_counter() - conn.opened, conn.nbytes, 1 if failed else 0)
+
+    def list_dir(self, serial, path, job=None):
+        """Return [(name, mode, size, mtime), ...] for path, without . and .."""
+        conn = self.open_sync(serial, job, "sync list")
+        try:
+            conn.sync_send(b"LIST", path.encode())
+            entries = []
+            while True:
+                ident, mode, size, mtime, namelen = struct.unpack("<4s4I", conn.recv_exact(20))
+                if ident == b"DONE":
+                    break
+                if ident == b"FAIL":
+                    conn.sync_fail(mode)
+                name = conn.recv_exact(namelen).decode(errors="surrogateescape")
+                if name not in (".", ".."):
+                    entries.append((name, mode, size, mtime))
+            conn.sync_send(b"QUIT")
+            return entries
+        finally:
+            self._release(conn, job)
+
+    def stat(self, serial, path, job=None):
+        """Return (mode, size, mtime); mode is 0 if path does not exist."""
+        conn = self.open_sync(serial, job, "sync stat")
+        try:
+            return self._stat(conn, path)
+        finally:
+            self._release(conn, job)
+
+    @staticmethod
+    def _stat(conn, path):
+        conn.sync_send(b"STAT", path.encode())
+        ident, mode, size, mtime = struct.unpack("<4s3I", conn.recv_exact(16))
+        if ident != b"STAT":
+            raise AdbError(f"unexpected sync reply {ident!r}")
+        return mode, size, mtime
+
+    def pull(self, serial, remote_path, local_path, progress=None, job=None):
+        """Download one file; progress(done, total) is called from the calling thread."""
+        conn = self.open_sync(serial, job, "sync recv")
+        try:
+            self._pull(conn, remote_path, local_path, progress)
+            conn.sync_send(b"QUIT")
+        finally:
+            self._release(conn, job)
+
+    def _pull(self, conn, remote_path, local_path, progress):
+        total = self._stat(conn, remote_path)[1]
+        conn.sync_send(b"RECV", remote_path.encode())
+        done = 0
+        # a failed pull must leave an existing local file alone: write next to it, then rename
+        folder, name = os.path.split(local_path)
+        part = os.path.join(folder, f".{name}.{uuid.uuid4().hex[:8]}.part")
+        f = open(part, "xb")
+        try:
+            with f:
+                while True:
+                    ident, length = conn.sync_header()
+                    if ident == b"DONE":
+                        break
+                    if ident == b"FAIL":
+                        conn.sync_fail(length)
+                    if ident != b"DATA":
+                        raise AdbError(f"unexpected sync reply {ident!r}")
+                    f.write(conn.recv_exact(length))
+                    done += length
+                    if progress:
+                        progress(done, total)
+            os.replace(part, local_path)
+        except BaseException:
+            os.remove(part)
+            raise
+
+    def pull_dir(self, serial, remote_path, local_path, progress=None, job=None):
+        """Recursively download a directory over a single sync connection."""
+        conn = self.open_sync(serial, job, "sync recv dir")
+        try:
+            self._pull_dir(conn, remote_path, local_path, progress)
+            conn.sync_send(b"QUIT")
+        finally:
+            self._release(conn, job)
+
+    def _pull_dir(self, conn, remote_path, local_path, progress):
+        os.makedirs(local_path, exist_ok=True)
+        conn.sync_send(b"LIST", remote_path.encode())
+        children = []
+        while True:
+            ident, mode, size, mtime, namelen = struct.unpack("<4s4I", conn.recv_exact(20))
+            if ident == b"DONE":
+                break
+            if ident == b"FAIL":
+                conn.sync_fail(mode)
+            name = conn.recv_exact(namelen).decode(errors="surrogateescape")
+            if name not in (".", ".."):
+                children.append((name, mode))
+        for name, mode in children:
+            remote_child = remote_path.rstrip("/") + "/" + name
+            local_child = os.path.join(local_path, name)
+            if stat.S_ISDIR(mode):
+                self._pull_dir(conn, remote_child, local_child, progress)
+            elif stat.S_ISREG(mode):
+                self._pull(conn, remote_child, local_child, progress)
+
+    def push(self, serial, local_path, remote_path, progress=None, job=None):
+        """Upload one file; progress(done, total) is called from the calling thread."""
+        st = os.stat(local_path)
+        conn = self.open_sync(serial, job, "sync send")
+        try:
+            conn.sync_send(b"SEND", f"{remote_path},{stat.S_IFREG | stat.S_IMODE(st.st_mode)}".encode())
+            done = 0
+            with open(local_path, "rb") as f:
+                while True:
+                    data = f.read(self.CHUNK)
+                    if not data:
+                        break
+                    conn.sync_send(b"DATA", data)
+                    done += len(data)
+                    if progress:
+                        progress(done, st.st_size)
+            conn.sock.sendall(b"DONE" + struct.pack("<I", int(st.st_mtime)))
+            ident, length = conn.sync_header()
+            if ident == b"FAIL":
+                conn.sync_fail(length)
+            conn.sync_send(b"QUIT")
+        finally:
+            self._release(conn, job)
+
+class DeviceTracker:
+    """Follows the adb server's host:track-devices stream on a daemon thread.
+
+    on_change([(serial, state), ...]) is called from that thread with the full device list
+    each time it changes, on_error(message) when the server cannot be reached. A broken
+    stream is reopened, starting the adb server first if nothing is listening.
+    """
+
+    def __init__(self, client, on_change, on_error=None):
+        self.client = client
+        self.on_change = on_change
+        self.on_error = on_error
+        self.stopped = threading.Event()
+        self.conn = None
+        self.thread = threading.Thread(target=self.run, name="track-devices", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        conn = self.conn
+        if conn:
+            conn.kill()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                with self.client.connect() as conn:
+                    self.conn = conn
+                    conn.request("host:track-devices")
+                    conn.sock.settimeout(None)  # updates only come when something is plugged or unplugged
+                    while not self.stopped.is_set():
+                        lines = conn.read_hex_string().splitlines()
+                        self.on_change([tuple(line.split("\t", 1)) for line in lines if "\t" in line])
+            except ConnectionRefusedError as e:
+                self.start_server()
+                self.report(e)
+            except (OSError, AdbError) as e:
+                self.report(e)
+            finally:
+                self.conn = None
+            self.stopped.wait(TRACK_RETRY_SECONDS)
+
+    def report(self, error):
+        if self.on_error and not self.stopped.is_set():
+            self.on_error(f"adb server at {self.client.host}:{self.client.port}: {error}")
+
+    @staticmethod
+    def start_server():
+        try:
+            subprocess.run(["adb", "start-server"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+class Transfer:
+    """One queued pull or push, with its progress and throughput."""
+
+    def __init__(self, kind, label, run, total=0, on_done=None, device=None):
+        self.kind = kind  # "pull", "push" or "sync"
+        self.label = label
+        self.run = run  # run(job, progress) performs the transfer on a worker thread
+        self.total = total  # expected bytes, 0 if unknown
+        self.on_done = on_done
+        self.device = device  # serial it talks to; its transfers pause while it is gone
+        self.state = "queued"  # queued, running, paused, done, failed or cancelled
+        self.done = 0
+        self.error = ""
+        self.started = None
+        self.finished = None
+        self.job = None
+
+    def rate(self):
+        """Average throughput in bytes/s since the transfer started."""
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        """Estimated seconds left, or None if unknown."""
+        rate = self.rate()
+        if self.state != "running" or not rate or self.total <= self.done:
+            return None
+        return (self.total - self.done) / rate
+
+class TransferQueue:
+    """Runs queued transfers on the executor, at most `workers` of them at a time.
+
+    All methods are called on the Tk main thread; on_update(transfer) is called
+    whenever a transfer is added or changes state or progress.
+    """
+
+    def __init__(self, executor, workers=3, on_update=None):
+        self.executor = executor
+        self.workers = workers
+        self.on_update = on_update
+        self.transfers = []
+        self.paused = set()  # devices that went away; their transfers wait for them
+
+    def add(self, transfer):
+        if transfer.device in self.paused:
+            transfer.state = "paused"
+        self.transfers.append(transfer)
+        self._update(transfer)
+        self._pump()
+
+    def set_workers(self, workers):
+        self.workers = max(1, workers)
+        self._pump()
+
+    def pause_device(self, device):
+        """Hold every transfer for a device that disconnected until resume_device()."""
+        self.paused.add(device)
+        now = time.monotonic()
+        for transfer in self.transfers:
+            if transfer.device != device:
+                continue
+            if transfer.state == "running":
+                transfer.job.cancel()  # failed() sees the device is paused
+            # a transfer that just failed most likely lost the device before the tracker said so
+            elif transfer.state == "queued" or (
+                transfer.state == "failed" and now - transfer.finished < DEVICE_LOST_GRACE
+            ):
+                transfer.state = "paused"
+                self._update(transfer)
+
+    def resume_device(self, device):
+        """Requeue the transfers paused for a device that is back."""
+        self.paused.discard(device)
+        for transfer in self.transfers:
+            if transfer.device == device and transfer.state == "paused":
+                transfer.state, transfer.done, transfer.error = "queued", 0, ""
+                transfer.started = transfer.finished = None
+                self._update(transfer)
+        self._pump()
+
+    def cancel(self, transfer):
+        if transfer.state in ("queued", "paused"):
+            transfer.state = "cancelled"
+            self._update(transfer)
+        elif transfer.state == "running":
+            transfer.job.cancel()
+
+    def retry(self, transfer):
+        if transfer.state in ("failed", "cancelled"):
+            transfer.state, transfer.done, transfer.error = "queued", 0, ""
+            transfer.started = transfer.finished = None
+            self._update(transfer)
+            self._pump()
+
+    def clear_finished(self):
+        self.transfers = [t for t in self.transfers if t.state in ("queued", "running", "paused")]
+
+    def running(self):
+        return sum(1 for t in self.transfers if t.state == "running")
+
+    def _pump(self):
+        free = self.workers - self.running()
+        for transfer in self.transfers:
+            if free <= 0:
+                break
+            if transfer.state == "queued":
+                self._start(transfer)
+                free -= 1
+
+    def _start(self, transfer):
+        transfer.state = "running"
+        transfer.started = time.monotonic()
+
+        def work(job):
+            transfer.run(job, throttled(job, lambda done, total: self._progress(transfer, done, total)))
+
+        def done(_):
+            self._finish(transfer, "done")
+            if transfer.on_done:
+                transfer.on_done()
+
+        def failed(e):
+            transfer.error = str(e)
+            if transfer.device in self.paused:
+                self._finish(transfer, "paused")
+            else:
+                self._finish(transfer, "cancelled" if isinstance(e, JobCancelled) else "failed")
+
+        transfer.job = self.executor.submit(f"{transfer.kind} {transfer.label}", work, done, failed)
+        self._update(transfer)
+
+    def _progress(self, transfer, done, total):
+        if transfer.state == "running":
+            transfer.done = done
+            if total:
+                transfer.total = total
+            self._update(transfer)
+
+    def _finish(self, transfer, state):
+        transfer.state = state
+        transfer.finished = time.monotonic()
+        if state == "done":
+            transfer.total = transfer.done = max(transfer.done, transfer.total)
+        self._update(transfer)
+        self._pump()
+
+    def _update(self, transfer):
+        if self.on_update:
+            self.on_update(transfer)
+
+class ProgressReader:
+    """File-like wrapper around a binary stream that reports bytes read to progress(done, total)."""
+
+    def __init__(self, stream, progress, total=0):
+        self.stream = stream
+        self.progress = progress
+        self.total = total
+        self.done = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.done += len(data)
+        self.progress(self.done, max(self.total, self.done) if self.total else 0)
+        return data
+
+class ProgressWriter:
+    """File-like wrapper around a binary stream that reports bytes written to progress(done, 0)."""
+
+    def __init__(self, stream, progress):
+        self.stream = stream
+        self.progress = progress
+        self.done = 0
+
+    def write(self, data):
+        self.stream.write(data)
+        self.done += len(data)
+        self.progress(self.done, 0)
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+def throttled(job, callback, interval=0.1):
+    """Wrap callback(done, total) for use on a worker thread: it runs on the Tk main
+    thread, at most once per interval (the final call always goes through)."""
+    last = [0.0]
+
+    def progress(done, total):
+        now = time.monotonic()
+        if now - last[0] < interval and not (total and done >= total):
+            return
+        last[0] = now
+        job.post(callback, done, total)
+
+    return progress
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds // 60 % 60:02}:{seconds % 60:02}"
+    return f"{seconds // 60}:{seconds % 60:02}"
+
+# Commands listing directories and their contents down to {limit} (e.g. -maxdepth 1) for the
+# index and sync: (command template, field separator). Records are perms, size, mtime and path.
+INDEX_FORMATS = {
+    "find": ("find {paths} {limit} -printf '%M\\0%s\\0%T@\\0%p\\0'", "\0"),
+    "stat": ("find {paths} {limit} -exec stat -c '%A\x1f%s\x1f%Y\x1f%n\x1f' {{}} +", "\x1f"),
+}
+INDEX_BATCH = 200  # directories per shell invocation while indexing
+
+def index_dir():
+    """Directory holding the per-device indexes and the session snapshot."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "adb-gui")
+
+def normalize_path(path):
+    path = re.sub("/+", "/", path)
+    return path.rstrip("/") or "/"
+
+def subtree_range(path):
+    """Return (low, high): the paths below directory path are those with low <= p < high.
+
+    Lets SQLite range-scan a primary key where substr() or LIKE would scan the whole table.
+    """
+    low = path if path == "/" else path + "/"
+    return low, low[:-1] + "0"  # "0" is the character after "/"
+
+def remote_records(job, shell, fmt, paths, depth=None):
+    """Yield (perms, size, mtime, path) for the given directories and everything below them
+    down to depth (1: their children; None: no limit), using one shell invocation."""
+    template, sep = INDEX_FORMATS[fmt]
+    quoted = " ".join(shlex.quote(p.rstrip("/") + "/") for p in paths)
+    limit = f"-maxdepth {depth}" if depth is not None else ""
+    res = shell(job, template.format(paths=quoted, limit=limit))
+    fields = res.stdout.split(sep)
+    for i in range(0, len(fields) - 3, 4):
+        perms, size, mtime, path = fields[i:i + 4]
+        try:
+            yield perms.lstrip("\n"), int(size), int(float(mtime)), normalize_path(path)
+        except ValueError:
+            continue
+
+class DeviceIndex:
+    """Persistent index of a device's file tree (path, size, mtime, type) in SQLite.
+
+    Built by crawling breadth-first, many directories per shell invocation; refreshed
+    by re-listing only directories whose mtime changed. Safe to use from several threads.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime INTEGER, run_as TEXT)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS files (dir TEXT, name TEXT, perms TEXT, size INTEGER, mtime INTEGER,"
+                " PRIMARY KEY (dir, name)) WITHOUT ROWID"
+            )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def stats(self):
+        with self.lock:
+            dirs = self.db.execute("SELECT count(*) FROM dirs").fetchone()[0]
+            files = self.db.execute("SELECT count(*) FROM files").fetchone()[0]
+        return dirs, files
+
+    def search(self, pattern, limit=1000):
+        """Find entries by name: a glob if pattern contains * ? or [, else a case-insensitive substring."""
+        if any(c in pattern for c in "*?["):
+            where, arg = "name GLOB ?", pattern
+        else:
+            where, arg = "name LIKE ? ESCAPE '\\'", "%" + re.sub(r"([%_\\])", r"\\\1", pattern) + "%"
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT dir, name, perms, size, mtime FROM files WHERE {where} LIMIT ?", (arg, limit)
+            ).fetchall()
+        return rows
+
+    def listing(self, path):
+        """Return the indexed listing of path as (total, entries, amount), or None if not indexed."""
+        path = normalize_path(path)
+        with self.lock:
+            if self.db.execute("SELECT 1 FROM dirs WHERE path = ?", (path,)).fetchone() is None:
+                return None
+            rows = self.db.execute("SELECT name, perms, size, mtime FROM files WHERE dir = ?", (path,)).fetchall()
+        entries = [FileEntry.from_fields(name, perms, "", "", size, mtime) for name, perms, size, mtime in rows]
+        return f"total {format_size(sum(max(e.size, 0) for e in entries))}", entries, len(entries)
+
+    def crawl(self, job, shell, fmt, root, run_as="", progress=None):
+        """Index everything below root from scratch."""
+        self._scan(job, shell, fmt, [normalize_path(root)], run_as, set(), progress)
+
+    def refresh(self, job, shell, fmt, root, run_as="", progress=None):
+        """Re-list only the directories below root whose mtime changed (crawl if none is known)."""
+        root = normalize_path(root)
+        with self.lock:
+            known = dict(self.db.execute(
+                "SELECT path, mtime FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (root, *subtree_range(root))
+            ).fetchall())
+        if not known:
+            self.crawl(job, shell, fmt, root, run_as, progress)
+            return
+        paths = sorted(known)
+        changed = []
+        for i in range(0, len(paths), INDEX_BATCH):
+            batch = paths[i:i + INDEX_BATCH]
+            mtimes = {path: mtime for _, _, mtime, path in remote_records(job, shell, fmt, batch, 0)}
+            for path in batch:
+                if path not in mtimes:
+                    self._forget(path)
+                elif mtimes[path] != known[path]:
+                    changed.append(path)
+            if progress:
+                progress(min(i + INDEX_BATCH, len(paths)), len(paths))
+        self._scan(job, shell, fmt, changed, run_as, set(known), progress)
+
+    def _scan(self, job, shell, fmt, pending, run_as, known, progress):
+        """List pending directories in batches; descend into subdirectories not in known."""
+        pending = deque(pending)
+        scanned = 0
+        while pending:
+            job.check()
+            batch = [pending.popleft() for _ in range(min(INDEX_BATCH, len(pending)))]
+            starts = set(batch)
+            dir_mtimes = {}
+            children = {path: [] for path in batch}
+            for perms, size, mtime, path in remote_records(job, shell, fmt, batch, 1):
+                if path in starts and path not in dir_mtimes:
+                    dir_mtimes[path] = mtime
+                    continue
+                parent, name = path.rsplit("/", 1)
+                parent = parent or "/"
+                if parent not in children:
+                    continue
+                children[parent].append((parent, name, perms, size, mtime))
+                if perms.startswith("d") and path not in known:
+                    pending.append(path)
+            with self.lock, self.db:
+                for path in batch:
+                    if path not in dir_mtimes:
+                        self._forget(path, locked=True)
+                        continue
+                    rows = children[path]
+                    old_dirs = {name for name, in self.db.execute(
+                        "SELECT name FROM files WHERE dir = ? AND perms LIKE 'd%'", (path,)
+                    )}
+                    for gone in old_dirs - {row[1] for row in rows if row[2].startswith("d")}:
+                        self._forget(path.rstrip("/") + "/" + gone, locked=True)
+                    self.db.execute("DELETE FROM files WHERE dir = ?", (path,))
+                    self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", rows)
+                    self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (path, dir_mtimes[path], run_as))
+            scanned += len(batch)
+            if progress:
+                progress(scanned, scanned + len(pending))
+
+    def _forget(self, path, locked=False):
+        """Drop a directory and everything below it from the index."""
+        if not locked:
+            with self.lock, self.db:
+                self._forget(path, locked=True)
+            return
+        low, high = subtree_range(path)
+        self.db.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+        self.db.execute("DELETE FROM files WHERE dir = ? OR (dir >= ? AND dir < ?)", (path, low, high))
+
+SYNC_MTIME_WINDOW = 2  # seconds two mtimes may differ and still match (FAT storage keeps 2 s steps)
+SYNC_BATCH = 200  # paths per md5sum/sha1sum, touch or rm invocation on the device
+SYNC_DIRECTIONS = ("device → local", "local → device")
+SYNC_COMPARE = ("size+mtime", "md5", "sha1")
+
+def remote_tree(job, shell, fmt, root):
+    """Map paths relative to a device directory to (is_dir, size, mtime) for everything below it.
+
+    Only directories and regular files are included; None if root is not a directory.
+    """
+    root = normalize_path(root)
+    prefix = root if root == "/" else root + "/"
+    tree = {}
+    found = False
+    for perms, size, mtime, path in remote_records(job, shell, fmt, [root]):
+        if path == root:
+            found = perms.startswith("d")
+        elif path.startswith(prefix) and perms[:1] in ("d", "-"):
+            tree[path[len(prefix):]] = (perms[:1] == "d", size, mtime)
+    return tree if found else None
+
+def local_tree(root):
+    """Map paths (with / separators) relative to a local directory to (is_dir, size, mtime)."""
+    tree = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            st = os.lstat(path)
+            if stat.S_ISDIR(st.st_mode) or stat.S_ISREG(st.st_mode):
+                rel = os.path.relpath(path, root).replace(os.sep, "/")
+                tree[rel] = (stat.S_ISDIR(st.st_mode), st.st_size, int(st.st_mtime))
+    return tree
+
+def remote_checksums(job, shell, root, paths, algorithm="md5"):
+    """Return {path: hex digest} for files below a device directory, SYNC_BATCH per invocation."""
+    sums = {}
+    for i in range(0, len(paths), SYNC_BATCH):
+        batch = paths[i:i + SYNC_BATCH]
+        args = " ".join(shlex.quote("./" + p) for p in batch)
+        res = shell(job, f"cd {shlex.quote(root)} && {algorithm}sum {args}", kind=f"shell {algorithm}sum")
+        for line in res.stdout.splitlines():
+            digest, _, name = line.partition("  ")
+            if name.startswith("./"):
+                sums[name[2:]] = digest.lower()
+    return sums
+
+def file_checksum(path, algorithm="md5", length=None):
+    """Return the hex digest of a local file, or of its first length bytes."""
+    digest = hashlib.new(algorithm)
+    left = length
+    with open(path, "rb") as f:
+        while left is None or left > 0:
+            data = f.read(STREAM_CHUNK if left is None else min(STREAM_CHUNK, left))
+            if not data:
+                break
+            digest.update(data)
+            if left is not None:
+                left -= len(data)
+    return digest.hexdigest()
+
+def sync_plan(source, target, delete=False, same=None):
+    """Return the actions making the target tree match the source tree (both as from local_tree).
+
+    Actions are (action, path, size, mtime) tuples. All "delete"s (extras, only with delete
+    set, and entries whose type changed) come first. Then "mkdir", "copy" (new files) and
+    "update" (changed files) follow mixed in path order, so a directory is made before its
+    contents. Files differing in size are changed; otherwise same(paths), if given, returns
+    the paths whose contents match, and the updates it finds come last. Without it, files
+    match when their mtimes are within SYNC_MTIME_WINDOW.
+    """
+    deletes = []
+    removed = set()
+    for path in sorted(target):
+        parent = path.rpartition("/")[0]
+        while parent and parent not in removed:
+            parent = parent.rpartition("/")[0]
+        if parent:
+            continue  # inside a directory already being deleted
+        wanted = source.get(path)
+        if (wanted is None and delete) or (wanted is not None and wanted[0] != target[path][0]):
+            removed.add(path)
+            deletes.append(("delete", path, 0, 0))
+    plan = []
+    compare = []
+    for path in sorted(source):
+        is_dir, size, mtime = source[path]
+        current = None if path in removed else target.get(path)
+        if is_dir:
+            if current is None:
+                plan.append(("mkdir", path, 0, mtime))
+        elif current is None:
+            plan.append(("copy", path, size, mtime))
+        elif current[1] != size:
+            plan.append(("update", path, size, mtime))
+        elif same is not None:
+            compare.append((path, size, mtime))
+        elif abs(current[2] - mtime) > SYNC_MTIME_WINDOW:
+            plan.append(("update", path, size, mtime))
+    if compare:
+        equal = same([path for path, _, _ in compare])
+        plan += [("update", path, size, mtime) for path, size, mtime in compare if path not in equal]
+    return deletes + plan
+
+OP_COMMANDS = {"delete": "rm -rf", "copy": "cp -a", "move": "mv -f", "mkdir": "mkdir -p"}
+
+def compile_ops(ops):
+    """Compile [(op, path, ...), ...] into one shell script (op a key of OP_COMMANDS).
+
+    Every operation runs even when an earlier one failed; each prints a record
+    "\\036<index> <exit status> <output>" for parse_op_results().
+    """
+    lines = []
+    for i, (op, *paths) in enumerate(ops):
+        args = " ".join(shlex.quote(path) for path in paths)
+        lines.append(f"__adbgui_out=$({OP_COMMANDS[op]} {args} 2>&1); printf '\\036%s %s %s\\n' {i} $? \"$__adbgui_out\"")
+    return "\n".join(lines)
+
+def parse_op_results(text, count, default="not run"):
+    """Return [(ok, message), ...] per operation from the output of a compile_ops() script."""
+    results = [[False, default] for _ in range(count)]
+    current = None
+    for line in text.split("\n"):
+        if line.startswith("\x1e"):
+            index, status, message = (line[1:].split(" ", 2) + ["", ""])[:3]
+            current = int(index)
+            results[current] = [status == "0", message]
+        elif current is not None and line:
+            results[current][1] += "\n" + line  # multi-line error output
+    return [tuple(result) for result in results]
+
+def decode_page(data, length, offset):
+    """Decode the page of `length` bytes read at offset; data may hold up to 3 bytes more.
+
+    A UTF-8 character crossing a page boundary is decoded whole with the page it starts
+    in, and skipped by the next one, so adjoining pages join up to the text of the file.
+    """
+    def continuation(start):
+        n = 0
+        while n < 3 and start + n < len(data) and 0x80 <= data[start + n] < 0xC0:
+            n += 1
+        return n
+
+    lead = continuation(0) if offset else 0
+    return data[lead:length + continuation(length)].decode(errors="replace")
+
+SNAPSHOT_MAX_ENTRIES = 20000  # larger listings are left out of the session snapshot
+
+def session_path():
+    return os.path.join(index_dir(), "session.json")
+
+def load_session():
+    """Return the snapshot saved by save_session() with its listing rebuilt, or None."""
+    try:
+        with open(session_path(), encoding="utf-8") as f:
+            snapshot = json.load(f)
+        listing = snapshot.get("listing")
+        if listing:
+            entries = [FileEntry(*row) for row in listing["entries"]]
+            snapshot["listing"] = (listing["total"], entries, listing["amount"])
+        return snapshot
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+def save_session(device_id, run_as, path, sort_spec, listing=None):
+    """Write the last device, path, run-as package, sort order and listing shown, for the next start."""
+    snapshot = {"device": device_id, "run_as": run_as, "path": path, "sort": sort_spec, "listing": None}
+    if listing and len(listing[1]) <= SNAPSHOT_MAX_ENTRIES:
+        total, entries, amount = listing
+        rows = [list(entry.values) + [entry.size, entry.mtime] for entry in entries]
+        snapshot["listing"] = {"total": total, "entries": rows, "amount": amount}
+    target = session_path()
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    os.replace(target + ".tmp", target)
+
+class ListingCache:
+    """In-memory LRU cache of parsed directory listings with a TTL.
+
+    Keys are (device_id, run_as, path) tuples.
+    """
+
+    def __init__(self, max_entries=64, ttl=60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            return None
+        stamp, value = item
+        if time.monotonic() - stamp > self.ttl:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = (time.monotonic(), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_entries:
+            self._items.popitem(last=False)
+
+    def invalidate(self, device_id, path, recursive=False):
+        """Drop listings of path (and everything below it if recursive) for any run-as value."""
+        path = path.rstrip("/") or "/"
+        prefix = path if path == "/" else path + "/"
+        for key in list(self._items):
+            dev, _, cached_path = key
+            if dev != device_id:
+                continue
+            if cached_path == path or (recursive and cached_path.startswith(prefix)):
+                del self._items[key]
+
+    def clear(self):
+        self._items.clear()
 
 class ADBFileManager:
     def __init__(self, root):
@@ -13,8 +1590,13 @@ class ADBFileManager:
         self.root.title("ADB File Manager")
         self.root.geometry("1200x800")
         self.current_path = "/"
-        self.sort_col = "1"
-        self.sort_asc = True
+        self.sort_spec = [("1", True)]  # (column, ascending) pairs, most significant first
+        self.entries = []  # FileEntry list of the listing currently shown
+        self.amount = 0  # number of entries in it, without . and ..
+        self.listing_key = None  # (device_id, run_as, path) self.entries was listed from
+        self.render_after = None  # after() id of the next chunk of rows to insert
+        self.streamed_rows = []  # rows of the listing still arriving, in arrival order
+        self.streamed_done = 0  # how many of them are in the file list
         self.path_var = tk.StringVar(value=self.current_path)
         self.error_var = tk.StringVar()
         self.run_as_var = tk.StringVar()
@@ -22,420 +1604,2088 @@ class ADBFileManager:
         self.amount_var = tk.StringVar()
         self.device_id = None  # selected ADB device serial number
         self.devices = []  # list of connected device serials
-        self.detect_devices()
+        self.device_states = {}  # serial -> state reported by the adb server (device, offline, unauthorized, ...)
+        self.device_status_var = tk.StringVar()
+        self.listing_cache = ListingCache()
+        self.listing_job = None  # background job fetching the listing about to be shown
+        self.restored = None  # ((device_id, run_as, path), listing) restored from the last session
+        self.sessions = {}  # (device_id, run_as, background) -> ShellSession
+        self.sessions_lock = threading.Lock()
+        self.listing_formats = {}  # (device_id, run_as) -> LISTING_FORMATS key that works there
+        self.server = AdbServerClient()
+        self.native_var = tk.BooleanVar(value=False)  # talk to the adb server socket directly
+        self.compress_var = tk.BooleanVar(value=False)  # gzip tar streams of run-as directories
+        self.verify_var = tk.BooleanVar(value=False)  # compare checksums after streamed uploads
+        self.jobs_var = tk.StringVar()
+        self.executor = Executor(root)
+        self.executor.on_change = self.on_jobs_changed
+        self.transfers = TransferQueue(self.executor, on_update=self.on_transfer_update)
+        self.transfer_window = None
+        self.transfer_list = None
+        self.transfer_rows = {}  # Transfer -> row in transfer_list
+        self.fan_window = None
+        self.indexes = {}  # device_id -> DeviceIndex
+        self.search_window = None
+        self.search_results = None
+        self.search_after = None
+        self.search_job = None  # background query whose results the search window waits for
+        self.search_var = tk.StringVar()
+        self.search_status_var = tk.StringVar()
+        self.sync_window = None
+        self.stats_window = None
+        self.preview_window = None
+        self.preview_target = None  # (device_id, run_as, path) of the previewed file
+        self.preview_pages = deque()  # [offset, bytes, text mark] per page held, in file order
+        self.preview_size = 0
+        self.preview_job = None  # fetch of a page in flight
+        self.preview_follow_job = None  # tail -f stream while following
+        if os.environ.get("ADB_GUI_TRACE"):
+            STATS.start_trace(os.environ["ADB_GUI_TRACE"])  # JSON lines of every adb command and listing phase
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.create_widgets()
+        self.error_var.set("Waiting for the adb server…")
+        self.restore_session()
+        self.tracker = DeviceTracker(
+            self.server,
+            lambda devices: self.executor.post(self.on_devices_changed, devices),
+            lambda message: self.executor.post(self.error_var.set, message),
+        )
+        self.tracker.start()
+
+    def adb_base(self, device_id=None):
+        """Return base adb command with the given (default: selected) device option."""
+        device_id = device_id or self.device_id
+        base = ["adb"]
+        if device_id:
+            base += ["-s", device_id]
+        return base
+
+    def run_adb(self, job, args, device_id=None):
+        """Run an adb command for the given (default: selected) device inside a job.
+
+        Returns the CompletedProcess; a non-zero exit status is left to the caller since
+        e.g. ls still prints usable output when some entries are unreadable.
+        """
+        return job.run(self.adb_base(device_id) + args)
+
+    def shell(self, job, command, device_id=None, run_as_val="", on_output=None, background=False, kind=None):
+        """Run a shell command line in the persistent session for the device (and run-as package).
+
+        Long-running work (indexing, sync, checksums) passes background=True to get a session
+        of its own, since a session runs one command at a time and listings must not queue behind it.
+        Scripts that do not start with the command they are about pass kind, their name in STATS.
+        """
+        device_id = device_id or self.device_id
+        key = (device_id, run_as_val, background)
+        with self.sessions_lock:
+            session = self.sessions.get(key)
+            if session is None:
+                cmd = self.adb_base(device_id) + ["shell"]
+                if run_as_val:
+                    cmd += ["run-as", run_as_val, "sh"]
+                session = self.sessions[key] = ShellSession(cmd)
+        return session.run(command, job, on_output, kind)
+
+    def close_sessions(self, keep_devices=()):
+        """Close shell sessions, except those of devices in keep_devices."""
+        with self.sessions_lock:
+            closing = [key for key in self.sessions if key[0] not in keep_devices]
+            sessions = [self.sessions.pop(key) for key in closing]
+        for session in sessions:
+            session.close()
+
+    def submit(self, name, fn, on_done=None, error_title=None):
+        """Run fn(job) in the background; errors are shown in the error label (and a dialog)."""
+        def on_error(e):
+            if isinstance(e, JobCancelled):
+                return
+            self.error_var.set(str(e))
+            print(str(e))
+            if error_title:
+                messagebox.showerror(error_title, str(e))
+
+        return self.executor.submit(name, fn, on_done, on_error)
+
+    def on_jobs_changed(self, jobs):
+        self.jobs_var.set(f"{len(jobs)} running" if jobs else "")
+
+    def cancel_jobs(self):
+        """Cancel every running adb operation."""
+        self.executor.cancel_all()
+
+    def restore_session(self):
+        """Show the device, path and listing of the last session until the device answers."""
+        snapshot = load_session()
+        if not snapshot or not snapshot.get("device"):
+            return
+        self.device_id = snapshot["device"]
+        self.device_var.set(self.device_id)
+        self.current_path = snapshot.get("path") or "/"
+        self.path_var.set(self.current_path)
+        self.run_as_var.set(snapshot.get("run_as") or "")
+        self.sort_spec = [tuple(spec) for spec in snapshot.get("sort") or self.sort_spec]
+        listing = snapshot.get("listing")
+        if listing:
+            self.restored = ((self.device_id, self.run_as_var.get().strip(), self.current_path), listing)
+            self.show_listing(self.restored[0], listing)
+        self.error_var.set(f"{self.device_id}: showing the last session until the device answers")
+
+    def on_close(self):
+        try:
+            run_as_val = self.run_as_var.get().strip()
+            listing = None
+            if not self.listing_job and self.listing_key == (self.device_id, run_as_val, self.current_path):
+                listing = (self.total_var.get(), self.entries, self.amount)
+            save_session(self.device_id, run_as_val, self.current_path, self.sort_spec, listing)
+        except OSError as e:
+            print(f"session snapshot: {e}")
+        self.tracker.stop()
+        self.executor.shutdown()
+        self.close_sessions()
+        for index in self.indexes.values():
+            index.close()
+        STATS.stop_trace()
+        self.root.destroy()
+
+    def detect_devices(self, on_ready=None):
+        """Populate self.devices and default device selection, then call on_ready()."""
+        native = self.native_var.get()
+
+        def work(job):
+            if native:
+                return [serial for serial, state in self.server.devices() if state == "device"]
+            res = job.run(["adb", "devices"])
+            if res.returncode != 0:
+                raise AdbError(res.stderr.strip())
+            lines = [l.strip() for l in res.stdout.splitlines()[1:] if l.strip()]
+            return [l.split()[0] for l in lines if "device" in l]
+
+        def done(devices):
+            self.devices = devices
+            if not self.devices:
+                self.device_combo["values"] = []
+                self.error_var.set("No connected Android devices: waiting for one to be plugged in")
+                return
+            self.device_id = self.devices[0]
+            if on_ready:
+                on_ready()
+
+        def failed(e):
+            if isinstance(e, JobCancelled):
+                return
+            self.error_var.set(str(e))
+            print(str(e))
+
+        self.executor.submit("devices", work, done, failed)
+
+    def on_devices_changed(self, devices):
+        """Apply a [(serial, state), ...] update from the device tracker.
+
+        Transfers and shell sessions of a device that disconnected or went offline are
+        paused and closed; when it is back its transfers resume and, if it is the selected
+        device, the listing is refreshed. The first device to appear gets selected.
+        """
+        states = dict(devices)
+        online = [serial for serial, state in devices if state == "device"]
+        was_online = self.device_id in self.devices
+        for serial in set(self.devices) - set(online):
+            self.transfers.pause_device(serial)
+        for serial in set(online) - set(self.devices):
+            self.transfers.resume_device(serial)
+        self.close_sessions(keep_devices=online)
+        self.devices, self.device_states = online, states
+        self.device_combo["values"] = online
+        self.device_status_var.set(", ".join(f"{serial}: {state}" for serial, state in devices if state != "device"))
+        if self.fan_window and self.fan_window.winfo_exists():
+            self.fill_fan_devices()
+        if self.restored and self.device_id not in online and online:
+            # the device of the last session is not here but another one is: start over on that
+            self.restored = None
+            self.device_id, self.current_path = None, "/"
+        if self.device_id in online:
+            if not was_online:
+                self.list_files(force=True)
+        elif self.device_id:
+            if self.listing_job:
+                self.listing_job.cancel()
+                self.listing_job = None
+            state = states.get(self.device_id, "disconnected")
+            if self.restored:
+                self.error_var.set(f"{self.device_id} is {state}: showing the last session until it is back")
+            else:
+                self.error_var.set(f"{self.device_id} is {state}: its transfers are paused until it is back")
+        elif online:
+            self.device_id = online[0]
+            self.device_var.set(self.device_id)
+            self.list_files()
+        else:
+            self.error_var.set("No connected Android devices: waiting for one to be plugged in")
+
+    def refresh_devices(self):
+        """Refresh list of connected devices and update combobox."""
+        prev = self.device_id
+
+        def ready():
+            # update combobox values and selection
+            self.device_combo["values"] = self.devices
+            self.close_sessions(keep_devices=self.devices)
+            if prev in self.devices:
+                self.device_id = prev
+            self.device_var.set(self.device_id)
+            self.list_files(force=True)
+
+        self.detect_devices(ready)
+
+    def on_device_change(self, event=None):
+        sel = self.device_var.get()
+        if sel and sel != self.device_id:
+            self.device_id = sel
+            self.current_path = "/"
+            self.list_files()
+
+    def fetch_listing(self, job, device_id, run_as_val, path, native=False, on_rows=None):
+        """Run ls on the device; returns ((total, entries, amount) or None, stderr text).
+
+        The output is parsed as it arrives; on_rows(entries), if given, receives the rows
+        parsed so far in batches: the first as soon as there is one, then at most one call
+        every LISTING_BATCH_SECONDS.
+        """
+        if not path.startswith("/data/data/"):
+            run_as_val = ""
+        started = time.perf_counter()
+        if native and not run_as_val:
+            items = self.server.list_dir(device_id, path, job)
+            fetched = time.perf_counter()
+            entries = [FileEntry.from_stat(*item) for item in items]
+            STATS.record("list fetch", device_id, fetched - started, path=path)
+            STATS.record("list parse", device_id, time.perf_counter() - fetched, path=path)
+            return ("", entries, len(entries)), ""
+        fmt = self.listing_format(job, device_id, run_as_val)
+        parser = LISTING_FORMATS[fmt][2]()
+        entries = []
+        pending = []
+        last_batch = [0.0]
+        parse = [0.0, 0]  # seconds spent in the parser, bytes fed to it
+
+        def on_output(chunk):
+            parse_started = time.perf_counter()
+            rows = parser.feed(chunk)
+            parse[0] += time.perf_counter() - parse_started
+            parse[1] += len(chunk)
+            entries.extend(rows)
+            if on_rows and rows:
+                pending.extend(rows)
+                now = time.monotonic()
+                if now - last_batch[0] >= LISTING_BATCH_SECONDS:
+                    last_batch[0] = now
+                    on_rows(pending[:])
+                    del pending[:]
+
+        res = self.shell(job, listing_command(fmt, path), device_id, run_as_val, on_output)
+        entries.extend(parser.close())
+        elapsed = time.perf_counter() - started
+        STATS.record("list fetch", device_id, elapsed - parse[0], parse[1], res.returncode, path=path, format=fmt)
+        STATS.record("list parse", device_id, parse[0], parse[1], path=path, format=fmt, entries=len(entries))
+        error = res.stderr.strip() if res.returncode != 0 else ""
+        if not entries and res.returncode != 0:
+            return None, error
+        return (parser.total, entries, parser.amount), error
+
+    def listing_format(self, job, device_id, run_as_val):
+        """Pick the best listing format the device shell supports (probed once per session)."""
+        key = (device_id, run_as_val)
+        fmt = self.listing_formats.get(key)
+        if fmt is None:
+            fmt = "ls"
+            for candidate in ("find", "stat"):
+                probe, _, parser_class = LISTING_FORMATS[candidate]
+                parser = parser_class()
+                res = self.shell(job, probe, device_id, run_as_val)
+                if res.returncode == 0 and len(parser.feed(res.stdout.encode(errors="surrogateescape"))) == 1:
+                    fmt = candidate
+                    break
+            self.listing_formats[key] = fmt
+        return fmt
+
+    def refresh_listing(self):
+        """Re-read the current path from the device, bypassing the listing cache."""
+        self.list_files(force=True)
+
+    def list_files(self, force=False):
+        """Show the current path, served from the listing cache unless force is set."""
+        self.error_var.set("")
+        self.forget_listing()
+        # Update the Name column header to show current path
+        # self.file_list.heading("Name", text=self.current_path, anchor="w")
+        self.path_var.set(self.current_path)
+        if self.listing_job:
+            self.listing_job.cancel()
+            self.listing_job = None
+        # Use persistent run-as if present
+        run_as_val = self.run_as_var.get().strip()
+        device_id, path, native = self.device_id, self.current_path, self.native_var.get()
+        key = (device_id, run_as_val, path)
+        listing = None if force else self.listing_cache.get(key)
+        if listing is not None:
+            self.show_listing(key, listing)
+            return
+        # Show the last session's listing, or else what the file index knows, while the device is asked
+        warm = self.restored[1] if self.restored and self.restored[0] == key else None
+        if warm is not None:
+            self.show_listing(key, warm)
+
+        def done(result):
+            if self.listing_job is not job:
+                return  # superseded by a later navigation
+            self.listing_job = None
+            self.restored = None
+            listing, error = result
+            if error:
+                self.error_var.set(error)
+                print(error)
+            if listing is None:
+                self.forget_listing()
+                return
+            self.listing_cache.put(key, listing)
+            self.show_listing(key, listing)
+
+        def rows(batch):
+            job.post(self.append_rows, job, batch)
+
+        def work(job):
+            on_rows = None
+            if warm is None:
+                # looked up here: the index may be busy with a crawl
+                index = self.find_index(device_id) if device_id else None
+                indexed = index.listing(path) if index else None
+                if indexed is not None:
+                    job.post(self.show_warm, job, key, indexed)
+                else:
+                    on_rows = rows
+            return self.fetch_listing(job, device_id, run_as_val, path, native, on_rows)
+
+        job = self.submit(f"ls {path}", work, done)
+        self.listing_job = job
+
+    def show_warm(self, job, key, listing):
+        """Show the indexed listing of a path while its listing job is still running."""
+        if self.listing_job is job:
+            self.show_listing(key, listing)
+
+    def append_rows(self, job, batch):
+        """Show rows of a listing that is still arriving, unsorted; the final sort follows when it completes."""
+        if self.listing_job is not job:
+            return
+        self.streamed_rows.extend(batch)
+        if not self.render_after:
+            self.insert_streamed()
+
+    def insert_streamed(self):
+        """Insert the next RENDER_CHUNK streamed rows and schedule the rest, like insert_rows()."""
+        start = self.streamed_done
+        end = min(start + RENDER_CHUNK, len(self.streamed_rows))
+        insert = self.file_list.insert
+        for i in range(start, end):
+            insert("", "end", values=self.streamed_rows[i].values)
+        self.streamed_done = end
+        self.amount_var.set(f"[{end}…]")
+        self.render_after = self.root.after(1, self.insert_streamed) if end < len(self.streamed_rows) else None
+
+    def show_listing(self, key, listing):
+        """Show listing, the (total, entries, amount) of key, a (device_id, run_as, path) tuple."""
+        total, self.entries, self.amount = listing
+        self.listing_key = key
+        self.total_var.set(total)
+        self.show_entries()
+
+    def forget_listing(self):
+        """Empty the file list and drop the listing behind it, e.g. while another path loads."""
+        self.entries, self.amount, self.listing_key = [], 0, None
+        self.total_var.set("")
+        self.amount_var.set("")
+        self.clear_file_list()
+
+    def clear_file_list(self):
+        """Empty the file list, dropping any rows still waiting to be inserted."""
+        if self.render_after:
+            self.root.after_cancel(self.render_after)
+            self.render_after = None
+        self.streamed_rows, self.streamed_done = [], 0
+        self.file_list.delete(*self.file_list.get_children())
+
+    def show_entries(self):
+        """Sort the current listing client-side and (re)fill the file list."""
+        self.clear_file_list()
+        self.show_sort_headers()
+        started = time.perf_counter()
+        rows = sort_entries(self.entries, self.sort_spec)
+        sorted_at = time.perf_counter()
+        STATS.record("list sort", self.device_id or "", sorted_at - started, entries=len(rows))
+        self.insert_rows(rows, 0, sorted_at)
+
+    def show_streamed(self):
+        """Sort the rows of a listing still arriving; batches that follow are appended after them."""
+        rows = sort_entries(self.streamed_rows, self.sort_spec)
+        self.clear_file_list()
+        self.show_sort_headers()
+        self.streamed_rows = rows
+        self.insert_streamed()
+
+    def show_sort_headers(self):
+        self.set_headers_text()
+        for col, asc in self.sort_spec:
+            heading, label = COLUMNS[col]
+            self.file_list.heading(heading, text=label + ("↓" if asc else "↑"))
+
+    def insert_rows(self, rows, start, started=None):
+        """Insert one chunk of rows and schedule the next, so huge directories never block the UI.
+
+        When all are in, the time since started (including event-loop turns in between) is
+        recorded as the render phase.
+        """
+        end = min(start + RENDER_CHUNK, len(rows))
+        insert = self.file_list.insert
+        for i in range(start, end):
+            insert("", "end", values=rows[i].values)
+        if end < len(rows):
+            self.amount_var.set(f"[{end}/{len(rows)}]")
+            self.render_after = self.root.after(1, self.insert_rows, rows, end, started)
+        else:
+            self.render_after = None
+            self.amount_var.set(f"[{self.amount}]")
+            if started is not None:
+                STATS.record("list render", self.device_id or "", time.perf_counter() - started, entries=len(rows))
+
+    def on_item_double_click(self, event):
+        selected = self.file_list.selection()
+        if not selected:
+            return
+        name = str(self.file_list.item(selected[0])["values"][0])
+        ftype = str(self.file_list.item(selected[0])["values"][1])
+        
+        if name == ".":
+            self.go_root()
+            return
+            
+        if name == "..":
+            self.go_up()
+            return
+            
+        if ftype == "link" and " -> " in name:
+            name = name.split(" -> ")[1]
+        if ftype in ("dir", "link"):
+            # If clicking on /data from root, use persistent run-as value
+            if self.current_path == "/" and name == "data":
+                run_as = self.run_as_var.get().strip()
+                if run_as:
+                    self.current_path = f"/data/data/{run_as}"
+                    self.list_files()
+                    return
+            self.current_path = os.path.join(self.current_path, name)
+            self.list_files()
+        else:
+            # It's a file – prompt user to choose save location and download via adb pull
+            if " -> " in name:
+                name = name.split(" -> ")[1]
+                self.current_path = os.path.join(self.current_path, name)
+                self.list_files()
+                return
+            remote_path = os.path.join(self.current_path, name)
+            local_path = filedialog.asksaveasfilename(initialfile=name, title="Save As")
+            if not local_path:
+                return  # user cancelled
+            entries = {e.values[0]: e for e in self.entries}
+            self.download_file_dialog(remote_path, local_path, self.entry_size(entries, name))
+
+    def go_root(self):
+        self.current_path = "/"
+        self.list_files()
+
+    def go_up(self):
+        if self.current_path == "/":
+            return
+        self.current_path = os.path.dirname(self.current_path)
         self.list_files()
 
-    @contextmanager
-    def busy_cursor(self, widget):
-        # set busy cursor
-        widget.config(cursor="watch")
-        widget.update_idletasks()
-        try:
-            yield
-        finally:
-            # always reset cursor
-            widget.config(cursor="")
-            widget.update_idletasks()
+    def download_selected(self):
+        """Download the selected files and directories (several go into one chosen folder)."""
+        items = self.selected_items()
+        if not items:
+            messagebox.showinfo("Download", "No file selected")
+            return
+        entries = {e.values[0]: e for e in self.entries}
+        if len(items) == 1:
+            remote_path, ftype, label = items[0]
+            name = os.path.basename(remote_path)
+            if ftype == "dir":
+                local_path = filedialog.askdirectory()
+                if local_path:
+                    self.download_dir_dialog(remote_path, local_path)
+            else:
+                local_path = filedialog.asksaveasfilename(
+                    initialfile=name,
+                    title="Save As",
+                    defaultextension=os.path.splitext(name)[1] or ""
+                )
+                if local_path:
+                    self.download_file_dialog(remote_path, local_path, self.entry_size(entries, label))
+            return
+        local_dir = filedialog.askdirectory(title=f"Download {len(items)} items to")
+        if not local_dir:
+            return
+        for remote_path, ftype, label in items:
+            if ftype == "dir":
+                self.download_dir_dialog(remote_path, local_dir)
+            else:
+                local_path = os.path.join(local_dir, os.path.basename(remote_path))
+                self.download_file_dialog(remote_path, local_path, self.entry_size(entries, label))
+
+    @staticmethod
+    def entry_size(entries, name):
+        """Size of a listed file, 0 if unknown (a link's own size says nothing about its target)."""
+        entry = entries.get(name)
+        return max(entry.size, 0) if entry and entry.values[1] != "link" else 0
+
+    def upload_file(self):
+        """Prompt user to select local files and upload them to the current path on the device."""
+        local_paths = filedialog.askopenfilenames(title="Select files to load")
+        for local_path in local_paths:
+            remote_path = os.path.join(self.current_path, os.path.basename(local_path))
+            self.upload_file_dialog(local_path, remote_path)
+
+    def upload_dir(self):
+        """Prompt user to select a local directory and upload it into the current path on the device."""
+        local_path = filedialog.askdirectory(title="Select directory to load")
+        if local_path:
+            self.upload_dir_dialog(local_path, self.current_path)
+
+    def selected_items(self):
+        """Return (device path, type, Name column text) for the selected rows, without . and ..
+
+        Links are addressed by their own name, not the "name -> target" shown.
+        """
+        items = []
+        for item in self.file_list.selection():
+            values = self.file_list.item(item)["values"]
+            label, ftype = str(values[0]), str(values[1])
+            name = label.split(" -> ", 1)[0] if ftype == "link" else label
+            if name not in (".", ".."):
+                items.append((os.path.join(self.current_path, name), ftype, label))
+        return items
+
+    def selected_paths(self):
+        """Return the device paths of the selected rows, without . and .. (links by their own name)."""
+        return [path for path, _, _ in self.selected_items()]
+
+    def delete_selected(self):
+        """Delete the selected files and directories on the device after confirmation."""
+        paths = self.selected_paths()
+        if not paths:
+            messagebox.showinfo("Delete", "No item selected")
+            return
+        what = f"'{paths[0]}'" if len(paths) == 1 else f"{len(paths)} items in '{self.current_path}'"
+        if not messagebox.askyesno("Confirm Delete", f"Delete {what} on device?"):
+            return
+        self.run_batch("rm", [("delete", path) for path in paths], [self.current_path])
+
+    def copy_selected(self, move=False):
+        """Copy (or move) the selected items into another directory on the device, without going through the host."""
+        paths = self.selected_paths()
+        title = "Move" if move else "Copy"
+        if not paths:
+            messagebox.showinfo(title, "No item selected")
+            return
+        target = simpledialog.askstring(
+            title, f"{title} {len(paths)} item(s) to device directory:", initialvalue=self.current_path
+        )
+        if not target:
+            return
+        target = normalize_path(os.path.join(self.current_path, target.strip()))
+        op = "move" if move else "copy"
+        changed = [self.current_path, target] if move else [target]
+        self.run_batch("mv" if move else "cp", [(op, path, target) for path in paths], changed)
+
+    def make_dir(self):
+        """Create a directory (with any missing parents) below the current path."""
+        name = simpledialog.askstring("New directory", f"Directory to create in '{self.current_path}':")
+        if not name:
+            return
+        self.run_batch("mkdir", [("mkdir", normalize_path(os.path.join(self.current_path, name.strip())))],
+                       [self.current_path])
+
+    def run_ops(self, job, device_id, run_as_val, ops):
+        """Run [(op, path, ...), ...] on the device as one script, in a single shell round trip.
+
+        The script runs as the run-as package when any path is inside its sandbox.
+        Returns [(ok, message), ...] in the order of ops.
+        """
+        sandbox = f"/data/data/{run_as_val}"
+        in_sandbox = run_as_val and any(path.startswith(sandbox) for _, *paths in ops for path in paths)
+        res = self.shell(job, compile_ops(ops), device_id, run_as_val if in_sandbox else "", kind="shell batch")
+        return parse_op_results(res.stdout, len(ops), res.stderr.strip() or "not run")
+
+    def run_batch(self, name, ops, changed):
+        """Run ops on the selected device in the background, then refresh the listings below
+        the changed directories and list the items that failed."""
+        self.error_var.set("")
+        device_id, run_as_val = self.device_id, self.run_as_var.get().strip()
+
+        def done(results):
+            for path in changed:
+                self.listing_cache.invalidate(device_id, path, recursive=True)
+            if self.device_id == device_id and any(
+                self.current_path == path or self.current_path.startswith(path.rstrip("/") + "/") for path in changed
+            ):
+                self.list_files()
+            failed = [(op, result[1]) for op, result in zip(ops, results) if not result[0]]
+            if failed:
+                self.error_var.set(f"{name}: {len(failed)} of {len(ops)} failed")
+                self.show_batch_failures(name, failed)
+
+        self.submit(f"{name} {len(ops)} items", lambda job: self.run_ops(job, device_id, run_as_val, ops), done,
+                    "Device Error")
+
+    def show_batch_failures(self, name, failed):
+        """List the operations of a batch that failed, with the device's error output."""
+        win = tk.Toplevel(self.root)
+        win.title(f"{name}: {len(failed)} failed")
+        win.geometry("800x300")
+        columns = ("Item", "Error")
+        tree = ttk.Treeview(win, columns=columns, show="headings", style="Mono.Treeview")
+        for col in columns:
+            tree.heading(col, text=col, anchor="w")
+        tree.column("Item", width=350, stretch=False)
+        tree.column("Error", stretch=True)
+        scrollbar = ttk.Scrollbar(win, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        for (op, *paths), message in failed:
+            tree.insert("", "end", values=(" → ".join(paths), " ".join(message.split())))
+
+    def run_polled(self, job, cmd, progress, local_path, total=0, stdout=subprocess.DEVNULL):
+        """Run an adb transfer command, reporting progress from the size of the growing local file."""
+        with tempfile.TemporaryFile() as err:
+            proc = job.popen(cmd, stdin=subprocess.DEVNULL, stdout=stdout, stderr=err)
+            try:
+                while True:
+                    try:
+                        proc.wait(timeout=PROGRESS_POLL_SECONDS)
+                        break
+                    except subprocess.TimeoutExpired:
+                        if os.path.isfile(local_path):
+                            progress(os.path.getsize(local_path), total)
+            finally:
+                job.release(proc, os.path.getsize(local_path) if os.path.isfile(local_path) else 0)
+            job.check()
+            err.seek(0)
+            message = err.read().decode(errors="replace").strip()
+        if proc.returncode != 0:
+            raise AdbError(message)
+        if os.path.isfile(local_path):
+            size = os.path.getsize(local_path)
+            progress(size, size)
+
+    def pull_file(self, job, progress, device_id, run_as_val, native, remote_path, local_path, total=0):
+        # Using adb pull is the most straightforward way. If run-as is required we'll try that first
+        # When using run-as, we need to execute cat via shell because adb pull does not work with run-as
+        in_sandbox = run_as_val and remote_path.startswith(f"/data/data/{run_as_val}")
+        if not total:
+            # large files must take the resumable path even when the caller did not know the size
+            try:
+                total = self.remote_size(job, device_id, run_as_val if in_sandbox else "", remote_path)
+            except AdbError:
+                pass  # no stat -c: a plain pull still works
+        if total >= RESUME_MIN_SIZE:
+            self.pull_resumable(job, progress, device_id, run_as_val, remote_path, local_path)
+        elif in_sandbox:
+            # Use exec-out to stream file contents
+            with open(local_path, "wb") as f:
+                cmd = self.adb_base(device_id) + ["exec-out", "run-as", run_as_val, "cat", remote_path]
+                self.run_polled(job, cmd, progress, local_path, total, stdout=f)
+        elif native:
+            self.server.pull(device_id, remote_path, local_path, progress, job)
+        else:
+            self.run_polled(job, self.adb_base(device_id) + ["pull", remote_path, local_path], progress, local_path, total)
+
+    def pull_dir(self, job, progress, device_id, run_as_val, native, remote_path, local_path, compress=False):
+        if run_as_val and remote_path.startswith(f"/data/data/{run_as_val}"):
+            # adb pull cannot read the app sandbox: stream it as one tar archive instead
+            self.pull_dir_tar(job, progress, device_id, run_as_val, remote_path, local_path, compress)
+            return
+        elif native:
+            # like adb pull, create the directory inside local_path
+            target = os.path.join(local_path, os.path.basename(remote_path.rstrip("/")))
+            self.server.pull_dir(device_id, remote_path, target, progress, job)
+            return
+        else:
+            args = ["pull", remote_path, local_path]
+        res = self.run_adb(job, args, device_id)
+        if res.returncode != 0:
+            raise AdbError(res.stderr.strip())
+
+    def pull_dir_tar(self, job, progress, device_id, run_as_val, remote_path, local_path, compress=False):
+        """Stream remote_path as a tar archive over exec-out, extracting entries as they arrive.
+
+        Like adb pull, the directory is created inside local_path.
+        """
+        parent, name = os.path.split(remote_path.rstrip("/"))
+        tar = f"tar c{'z' if compress else ''}f - -C {shlex.quote(parent or '/')} {shlex.quote(name)}"
+        cmd = self.adb_base(device_id) + ["exec-out", f"run-as {shlex.quote(run_as_val)} {tar}"]
+        total = 0
+        if not compress:
+            # the uncompressed archive is about as large as the tree
+            res = self.shell(job, f"du -sk {shlex.quote(remote_path)}", device_id, run_as_val, background=True)
+            if res.returncode == 0 and res.stdout.split():
+                total = int(res.stdout.split()[0]) * 1024
+        with tempfile.TemporaryFile() as err:
+            proc = job.popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=err)
+            try:
+                reader = ProgressReader(proc.stdout, progress, total)
+                try:
+                    with tarfile.open(fileobj=reader, mode="r|gz" if compress else "r|") as archive:
+                        for member in archive:
+                            archive.extract(member, local_path, **TAR_EXTRACT_ARGS)
+                except (tarfile.TarError, OSError) as e:
+                    # e.g. a link refused by the extraction filter or a full disk: nothing
+                    # drains the stream any more, so stop the device side instead of waiting
+                    proc.kill()
+                    error = e
+                else:
+                    error = None
+                proc.wait()
+            finally:
+                job.release(proc, reader.done)
+            job.check()
+            err.seek(0)
+            message = err.read().decode(errors="replace").strip()
+        if error:
+            raise AdbError(f"{remote_path}: {error}")
+        if proc.returncode != 0:
+            raise AdbError(message or f"tar exited with status {proc.returncode}")
+
+    def push_dir(self, job, progress, device_id, run_as_val, local_path, remote_dir, compress=False):
+        """Upload the local directory into remote_dir (like adb push).
+
+        For run-as targets the tree is streamed as one tar archive into `tar x` over exec-in.
+        """
+        if not (run_as_val and remote_dir.startswith(f"/data/data/{run_as_val}")):
+            res = self.run_adb(job, ["push", local_path, remote_dir], device_id)
+            if res.returncode != 0:
+                raise AdbError(res.stderr.strip())
+            return
+        tar = f"tar x{'z' if compress else ''}f - -C {shlex.quote(remote_dir)}"
+        cmd = self.adb_base(device_id) + ["exec-in", f"run-as {shlex.quote(run_as_val)} {tar}"]
+        with tempfile.TemporaryFile() as err:
+            proc = job.popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err)
+            try:
+                writer = ProgressWriter(proc.stdin, progress)
+                error = None
+                try:
+                    with tarfile.open(fileobj=writer, mode="w|gz" if compress else "w|") as archive:
+                        archive.add(local_path, arcname=os.path.basename(local_path.rstrip(os.sep)))
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass  # the device side gave up; its error is reported below
+                except (tarfile.TarError, OSError) as e:
+                    # e.g. an unreadable local file: a truncated archive must not be extracted
+                    proc.kill()
+                    error = e
+                proc.wait()
+            finally:
+                job.release(proc, writer.done)
+            job.check()
+            err.seek(0)
+            message = err.read().decode(errors="replace").strip()
+        if error:
+            raise AdbError(f"{local_path}: {error}")
+        if proc.returncode != 0:
+            raise AdbError(message or f"tar exited with status {proc.returncode}")
+
+    def push_file(self, job, progress, device_id, run_as_val, native, local_path, remote_path, verify=False):
+        size = os.path.getsize(local_path)
+        if size >= RESUME_MIN_SIZE:
+            self.push_resumable(job, progress, device_id, run_as_val, local_path, remote_path)
+            return
+        elif run_as_val and remote_path.startswith(f"/data/data/{run_as_val}"):
+            # adb push cannot write into the app sandbox: pipe the file into run-as directly
+            self.push_stream(job, progress, device_id, run_as_val, local_path, remote_path, verify)
+            return
+        elif native:
+            self.server.push(device_id, local_path, remote_path, progress, job)
+        else:
+            res = self.run_adb(job, ["push", local_path, remote_path], device_id)
+            if res.returncode != 0:
+                raise AdbError(res.stderr.strip())
+        progress(size, size)
+
+    def push_stream(self, job, progress, device_id, run_as_val, local_path, remote_path, verify=False):
+        """Pipe local_path into `cat > remote_path` run as the app over exec-in, without a temp copy.
+
+        The result is checked by size, and by SHA-1 as well if verify is set.
+        """
+        size = os.path.getsize(local_path)
+        script = f"cat > {shlex.quote(remote_path)}"
+        cmd = self.adb_base(device_id) + ["exec-in", f"run-as {shlex.quote(run_as_val)} sh -c {shlex.quote(script)}"]
+        digest = hashlib.sha1()
+        with tempfile.TemporaryFile() as err:
+            proc = job.popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err)
+            try:
+                done = 0
+                with open(local_path, "rb") as f:
+                    try:
+                        for data in iter(lambda: f.read(STREAM_CHUNK), b""):
+                            proc.stdin.write(data)
+                            digest.update(data)
+                            done += len(data)
+                            progress(done, size)
+                        proc.stdin.close()
+                    except BrokenPipeError:
+                        pass  # the device side gave up; its error is reported below
+                proc.wait()
+            finally:
+                job.release(proc, done)
+            job.check()
+            err.seek(0)
+            message = err.read().decode(errors="replace").strip()
+        if proc.returncode != 0:
+            raise AdbError(message or f"upload exited with status {proc.returncode}")
+        res = self.shell(job, f"wc -c < {shlex.quote(remote_path)}", device_id, run_as_val)
+        remote_size = res.stdout.strip()
+        if remote_size != str(size):
+            raise AdbError(f"{remote_path}: device has {remote_size or '?'} bytes, expected {size}")
+        if verify:
+            remote_digest = self.remote_checksum(job, device_id, run_as_val, remote_path)
+            if remote_digest != digest.hexdigest():
+                raise AdbError(f"{remote_path}: SHA-1 mismatch after upload")
+
+    def pull_resumable(self, job, progress, device_id, run_as_val, remote_path, local_path):
+        """Download a large file as RESUME_CHUNK pieces streamed by dd over exec-out.
+
+        Complete chunks go to local_path + ".part"; a journal next to it records the remote
+        file (size and mtime) and how many chunks are done, so an interrupted download
+        continues from the last complete chunk, here or when the transfer is retried.
+        The result must match the SHA-1 computed on the device before it replaces local_path.
+        """
+        in_sandbox = run_as_val and remote_path.startswith(f"/data/data/{run_as_val}")
+        shell_run_as = run_as_val if in_sandbox else ""
+        res = self.shell(job, f"stat -c '%s %Y' {shlex.quote(remote_path)}", device_id, shell_run_as)
+        try:
+            size, mtime = map(int, res.stdout.split())
+        except ValueError:
+            raise AdbError(res.stderr.strip() or f"cannot stat {remote_path}")
+        part, journal_path = local_path + ".part", local_path + ".part.json"
+        state = {"remote": remote_path, "size": size, "mtime": mtime, "chunk": RESUME_CHUNK}
+        chunks = 0
+        try:
+            with open(journal_path) as f:
+                journal = json.load(f)
+            if {key: journal.get(key) for key in state} == state and os.path.exists(part):
+                chunks = journal["chunks"]
+        except (OSError, ValueError, KeyError):
+            pass
+        digest = hashlib.sha1()
+        with open(part, "r+b" if chunks else "w+b") as f:
+            f.truncate(min(chunks * RESUME_CHUNK, size))
+            for data in iter(lambda: f.read(STREAM_CHUNK), b""):
+                digest.update(data)
+
+            def commit(data):
+                nonlocal chunks
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                digest.update(data)
+                chunks += 1
+                with open(journal_path + ".tmp", "w") as j:
+                    json.dump(dict(state, chunks=chunks), j)
+                os.replace(journal_path + ".tmp", journal_path)
+
+            attempts = 0
+            while f.tell() < size:
+                start = chunks
+                dd = f"dd if={shlex.quote(remote_path)} bs={RESUME_CHUNK} skip={chunks} 2>/dev/null"
+                if shell_run_as:
+                    dd = f"run-as {shlex.quote(shell_run_as)} {dd}"
+                with tempfile.TemporaryFile() as err:
+                    proc = job.popen(
+                        self.adb_base(device_id) + ["exec-out", dd],
+                        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=err,
+                    )
+                    try:
+                        buf = bytearray()
+                        for data in iter(lambda: proc.stdout.read1(STREAM_CHUNK), b""):
+                            buf += data[:size - f.tell() - len(buf)]
+                            while len(buf) >= RESUME_CHUNK or (buf and f.tell() + len(buf) == size):
+                                commit(bytes(buf[:RESUME_CHUNK]))
+                                del buf[:RESUME_CHUNK]
+                            progress(f.tell() + len(buf), size)
+                        proc.wait()
+                    finally:
+                        job.release(proc, f.tell() + len(buf) - start * RESUME_CHUNK)
+                    job.check()
+                    err.seek(0)
+                    message = err.read().decode(errors="replace").strip()
+                if f.tell() < size:
+                    # the stream broke: whatever arrived after the last complete chunk is dropped
+                    attempts = 1 if chunks > start else attempts + 1
+                    if attempts >= RESUME_ATTEMPTS:
+                        raise AdbError(message or f"{remote_path}: transfer interrupted at {format_size(f.tell())}")
+                    time.sleep(attempts)
+                    job.check()
+        remote_digest = self.remote_checksum(job, device_id, shell_run_as, remote_path)
+        os.remove(journal_path)
+        if remote_digest != digest.hexdigest():
+            os.remove(part)
+            raise AdbError(f"{remote_path}: SHA-1 mismatch after download, partial file discarded")
+        os.replace(part, local_path)
+
+    def push_resumable(self, job, progress, device_id, run_as_val, local_path, remote_path):
+        """Upload a large file through dd over exec-in into remote_path + ".part" on the device.
+
+        An interrupted upload continues from the last complete RESUME_CHUNK already on the
+        device. A part this call did not write is only resumed if its SHA-1 so far matches
+        the start of the local file; otherwise the upload starts over. The part replaces
+        remote_path only once its SHA-1 matches the local file.
+        """
+        in_sandbox = run_as_val and remote_path.startswith(f"/data/data/{run_as_val}")
+        shell_run_as = run_as_val if in_sandbox else ""
+        size = os.path.getsize(local_path)
+        part = remote_path + ".part"
+        attempts = 0
+        last_offset = -1
+        while True:
+            res = self.shell(job, f"wc -c < {shlex.quote(part)}", device_id, shell_run_as)
+            remote_size = int(res.stdout) if res.returncode == 0 and res.stdout.strip().isdigit() else 0
+            offset = min(remote_size, size) // RESUME_CHUNK * RESUME_CHUNK
+            if offset and last_offset < 0:
+                # left over from an earlier upload, possibly of another file
+                res = self.shell(
+                    job, f"head -c {offset} {shlex.quote(part)} | sha1sum", device_id, shell_run_as,
+                    background=True, kind="shell sha1sum",
+                )
+                if res.stdout.split()[:1] != [file_checksum(local_path, "sha1", offset)]:
+                    offset = 0
+            if offset > last_offset >= 0:
+                attempts = 0  # the previous attempt got some chunks through
+            last_offset = offset
+            # without conv=notrunc, dd cuts the part off at the seek offset before writing
+            script = f"dd of={shlex.quote(part)} bs={RESUME_CHUNK} seek={offset // RESUME_CHUNK} 2>/dev/null"
+            prefix = f"run-as {shlex.quote(shell_run_as)} " if shell_run_as else ""
+            cmd = self.adb_base(device_id) + ["exec-in", f"{prefix}sh -c {shlex.quote(script)}"]
+            digest = hashlib.sha1()
+            with tempfile.TemporaryFile() as err:
+                proc = job.popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err)
+                try:
+                    done = 0
+                    with open(local_path, "rb") as f:
+                        try:
+                            for data in iter(lambda: f.read(STREAM_CHUNK), b""):
+                                digest.update(data)
+                                if done + len(data) > offset:
+                                    proc.stdin.write(data[max(offset - done, 0):])
+                                done += len(data)
+                                progress(done, size)
+                            proc.stdin.close()
+                        except BrokenPipeError:
+                            pass  # the device side gave up; resumed below
+                    proc.wait()
+                finally:
+                    job.release(proc, max(done - offset, 0))
+                job.check()
+                err.seek(0)
+                message = err.read().decode(errors="replace").strip()
+            if proc.returncode == 0 and done == size:
+                break
+            attempts += 1
+            if attempts >= RESUME_ATTEMPTS:
+                raise AdbError(message or f"{remote_path}: upload interrupted")
+            time.sleep(attempts)
+            job.check()
+        remote_digest = self.remote_checksum(job, device_id, shell_run_as, part)
+        if remote_digest != digest.hexdigest():
+            self.shell(job, f"rm -f {shlex.quote(part)}", device_id, shell_run_as)
+            raise AdbError(f"{remote_path}: SHA-1 mismatch after upload, partial file discarded")
+        res = self.shell(job, f"mv -f {shlex.quote(part)} {shlex.quote(remote_path)}", device_id, shell_run_as)
+        if res.returncode != 0:
+            raise AdbError(res.stderr.strip())
+
+    def remote_checksum(self, job, device_id, run_as_val, remote_path, algorithm="sha1"):
+        """Return the hex digest of a device file computed on the device (toybox md5sum/sha1sum)."""
+        res = self.shell(job, f"{algorithm}sum {shlex.quote(remote_path)}", device_id, run_as_val, background=True)
+        if res.returncode != 0 or not res.stdout.strip():
+            raise AdbError(res.stderr.strip() or f"{algorithm}sum failed for {remote_path}")
+        return res.stdout.split()[0].lower()
+
+    def transfer_context(self):
+        """Capture the device, run-as package and backend for a transfer started now."""
+        return self.device_id, self.run_as_var.get().strip(), self.native_var.get()
+
+    def download_dir_dialog(self, remote_path, local_path):
+        """Queue the download of a directory from the device to the given local path."""
+        context = self.transfer_context()
+        compress = self.compress_var.get()
+        self.transfers.add(Transfer(
+            "pull", remote_path,
+            lambda job, progress: self.pull_dir(job, progress, *context, remote_path, local_path, compress),
+            device=context[0],
+        ))
+        self.show_transfers()
+
+    def upload_dir_dialog(self, local_path, remote_dir):
+        """Queue the upload of a local directory into remote_dir on the device."""
+        device_id, run_as_val, _ = self.transfer_context()
+        compress = self.compress_var.get()
+
+        def done():
+            self.listing_cache.invalidate(device_id, remote_dir)
+            if (self.device_id, self.current_path) == (device_id, remote_dir):
+                self.list_files()
+
+        self.transfers.add(Transfer(
+            "push", local_path,
+            lambda job, progress: self.push_dir(job, progress, device_id, run_as_val, local_path, remote_dir, compress),
+            on_done=done,
+            device=device_id,
+        ))
+        self.show_transfers()
+
+    def download_file_dialog(self, remote_path, local_path, total=0):
+        """Queue the download of a single file from the device to the given local path."""
+        context = self.transfer_context()
+        self.transfers.add(Transfer(
+            "pull", remote_path,
+            lambda job, progress: self.pull_file(job, progress, *context, remote_path, local_path, total),
+            total,
+            device=context[0],
+        ))
+        self.show_transfers()
+
+    def upload_file_dialog(self, local_path, remote_path):
+        """Queue the upload of local_path to remote_path on device, handling run-as if needed."""
+        context = self.transfer_context()
+        device_id = context[0]
+        verify = self.verify_var.get()
+
+        def done():
+            parent = os.path.dirname(remote_path)
+            self.listing_cache.invalidate(device_id, parent)
+            # Optionally refresh view
+            if (self.device_id, self.current_path) == (device_id, parent):
+                self.list_files()
+
+        self.transfers.add(Transfer(
+            "push", remote_path,
+            lambda job, progress: self.push_file(job, progress, *context, local_path, remote_path, verify),
+            os.path.getsize(local_path),
+            done,
+            device_id,
+        ))
+        self.show_transfers()
+
+    def show_transfers(self):
+        """Open (or raise) the transfer queue window."""
+        if self.transfer_window is not None and self.transfer_window.winfo_exists():
+            self.transfer_window.deiconify()
+            self.transfer_window.lift()
+            return
+        win = self.transfer_window = tk.Toplevel(self.root)
+        win.title("Transfers")
+        win.geometry("900x300")
+
+        toolbar = ttk.Frame(win)
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text="Retry", width=7, command=self.retry_transfers, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Cancel", width=7, command=self.cancel_transfers, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Clear", width=7, command=self.clear_transfers, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+        ttk.Label(toolbar, text="parallel").pack(side=tk.LEFT, padx=(0, 5))
+        workers_var = tk.IntVar(value=self.transfers.workers)
+        ttk.Spinbox(
+            toolbar, from_=1, to=8, width=3, textvariable=workers_var,
+            command=lambda: self.transfers.set_workers(workers_var.get()),
+        ).pack(side=tk.LEFT)
+
+        columns = ("Transfer", "State", "Progress", "Speed", "ETA")
+        tree_frame = ttk.Frame(win)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        v_scroll = ttk.Scrollbar(tree_frame, orient="vertical")
+        v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.transfer_list = ttk.Treeview(
+            tree_frame, columns=columns, show="headings", style="Mono.Treeview", yscrollcommand=v_scroll.set
+        )
+        v_scroll.configure(command=self.transfer_list.yview)
+        for col in columns:
+            self.transfer_list.heading(col, text=col, anchor="w" if col == "Transfer" else "center")
+        self.transfer_list.column("Transfer", stretch=True)
+        self.transfer_list.column("State", width=80, stretch=False)
+        self.transfer_list.column("Progress", width=170, stretch=False, anchor="e")
+        self.transfer_list.column("Speed", width=90, stretch=False, anchor="e")
+        self.transfer_list.column("ETA", width=70, stretch=False, anchor="e")
+        self.transfer_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.transfer_rows = {}
+        for transfer in self.transfers.transfers:
+            self.on_transfer_update(transfer)
+
+    def on_transfer_update(self, transfer):
+        if transfer.state == "failed":
+            self.error_var.set(f"{transfer.label}: {transfer.error}")
+        if self.transfer_window is None or not self.transfer_window.winfo_exists():
+            return
+        progress = format_size(transfer.done)
+        if transfer.total:
+            progress = f"{transfer.done * 100 // transfer.total}% {progress}/{format_size(transfer.total)}"
+        rate = transfer.rate()
+        eta = transfer.eta()
+        values = (
+            f"{transfer.kind} {transfer.label}",
+            transfer.state,
+            progress,
+            f"{format_size(int(rate))}/s" if rate else "",
+            format_duration(eta) if eta is not None else "",
+        )
+        item = self.transfer_rows.get(transfer)
+        if item is None:
+            self.transfer_rows[transfer] = self.transfer_list.insert("", "end", values=values)
+        else:
+            self.transfer_list.item(item, values=values)
+
+    def selected_transfers(self):
+        rows = set(self.transfer_list.selection())
+        return [t for t, item in self.transfer_rows.items() if item in rows]
+
+    def retry_transfers(self):
+        for transfer in self.selected_transfers():
+            self.transfers.retry(transfer)
+
+    def cancel_transfers(self):
+        for transfer in self.selected_transfers():
+            self.transfers.cancel(transfer)
+
+    def clear_transfers(self):
+        self.transfers.clear_finished()
+        for transfer in list(self.transfer_rows):
+            if transfer not in self.transfers.transfers:
+                self.transfer_list.delete(self.transfer_rows.pop(transfer))
+
+    def show_stats(self):
+        """Open (or raise) the window with adb command and listing phase latencies."""
+        if self.stats_window is not None and self.stats_window.winfo_exists():
+            self.stats_window.deiconify()
+            self.stats_window.lift()
+            return
+        win = self.stats_window = tk.Toplevel(self.root)
+        win.title("Stats")
+        win.geometry("1000x400")
+        self.trace_var = tk.StringVar()
+
+        toolbar = ttk.Frame(win)
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text="Reset", width=7, command=self.reset_stats, padding=(0, 0)).pack(side=tk.LEFT)
+        self.trace_btn = ttk.Button(toolbar, width=11, command=self.toggle_trace, padding=(0, 0))
+        self.trace_btn.pack(side=tk.LEFT)
+        ttk.Label(toolbar, textvariable=self.trace_var).pack(side=tk.LEFT, padx=5)
+
+        columns = ("Command", "Device", "Count", "Errors", "p50", "p90", "Max", "Bytes", "Histogram")
+        tree_frame = ttk.Frame(win)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        v_scroll = ttk.Scrollbar(tree_frame, orient="vertical")
+        v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.stats_list = ttk.Treeview(
+            tree_frame, columns=columns, show="headings", style="Mono.Treeview", yscrollcommand=v_scroll.set
+        )
+        v_scroll.configure(command=self.stats_list.yview)
+        for col in columns:
+            self.stats_list.heading(col, text=col, anchor="w" if col in ("Command", "Device", "Histogram") else "e")
+        self.stats_list.column("Command", width=170, stretch=True)
+        self.stats_list.column("Device", width=150, stretch=False)
+        for col in ("Count", "Errors"):
+            self.stats_list.column(col, width=60, stretch=False, anchor="e")
+        for col in ("p50", "p90", "Max", "Bytes"):
+            self.stats_list.column(col, width=85, stretch=False, anchor="e")
+        self.stats_list.column("Histogram", width=130, stretch=False)
+        self.stats_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        bounds = " ".join(format_latency(b).replace(" ", "") for b in LATENCY_BUCKETS)
+        ttk.Label(
+            win, text=f"histogram buckets up to {bounds}, then slower; latest {STATS.window} samples", anchor="w"
+        ).pack(fill=tk.X, padx=5)
+        self.refresh_stats()
+
+    def refresh_stats(self):
+        """Redraw the stats window, then again every STATS_REFRESH_MS while it is open."""
+        if self.stats_window is None or not self.stats_window.winfo_exists():
+            return
+        self.trace_btn.configure(text="Stop trace" if STATS.trace_path else "Trace…")
+        self.trace_var.set(f"tracing to {STATS.trace_path}" if STATS.trace_path else "")
+        self.stats_list.delete(*self.stats_list.get_children())
+        for kind, device, count, errors, p50, p90, slowest, nbytes, histogram in STATS.summary():
+            self.stats_list.insert("", "end", values=(
+                kind, device, count, errors or "", format_latency(p50), format_latency(p90),
+                format_latency(slowest), format_size(nbytes) if nbytes else "", sparkline(histogram),
+            ))
+        self.stats_window.after(STATS_REFRESH_MS, self.refresh_stats)
+
+    def reset_stats(self):
+        STATS.reset()
+        self.refresh_stats()
+
+    def toggle_trace(self):
+        """Start writing every sample to a JSON-lines file, or stop doing so."""
+        if STATS.trace_path:
+            STATS.stop_trace()
+        else:
+            path = filedialog.asksaveasfilename(
+                title="Trace to", initialfile="adb-gui-trace.jsonl", defaultextension=".jsonl", parent=self.stats_window
+            )
+            if not path:
+                return
+            try:
+                STATS.start_trace(path)
+            except OSError as e:
+                messagebox.showerror("Trace", str(e), parent=self.stats_window)
+        self.trace_btn.configure(text="Stop trace" if STATS.trace_path else "Trace…")
+        self.trace_var.set(f"tracing to {STATS.trace_path}" if STATS.trace_path else "")
+
+    def remote_size(self, job, device_id, run_as_val, remote_path):
+        res = self.shell(job, f"stat -c %s {shlex.quote(remote_path)}", device_id, run_as_val)
+        try:
+            return int(res.stdout.split()[0])
+        except (ValueError, IndexError):
+            raise AdbError(res.stderr.strip() or f"cannot stat {remote_path}")
+
+    def read_range(self, job, device_id, run_as_val, remote_path, offset, length):
+        """Return length bytes of a device file from offset on (fewer at its end), read by dd over exec-out."""
+        dd = (
+            f"dd if={shlex.quote(remote_path)} bs={PREVIEW_PAGE} iflag=skip_bytes,count_bytes"
+            f" skip={offset} count={length} 2>/dev/null"
+        )
+        if run_as_val:
+            dd = f"run-as {shlex.quote(run_as_val)} {dd}"
+        res = job.run(self.adb_base(device_id) + ["exec-out", dd], text=False)
+        if res.returncode != 0 and not res.stdout:
+            raise AdbError(res.stderr.decode(errors="replace").strip() or f"cannot read {remote_path}")
+        return res.stdout
+
+    def show_preview(self):
+        """Open (or reuse) the preview of the selected device file; only the byte ranges shown are fetched."""
+        paths = self.selected_paths()
+        if len(paths) != 1:
+            messagebox.showinfo("Preview", "Select one file")
+            return
+        run_as_val = self.run_as_var.get().strip()
+        in_sandbox = run_as_val and paths[0].startswith(f"/data/data/{run_as_val}")
+        self.stop_follow()
+        self.preview_target = (self.device_id, run_as_val if in_sandbox else "", paths[0])
+        if self.preview_window is not None and self.preview_window.winfo_exists():
+            self.preview_window.deiconify()
+            self.preview_window.lift()
+        else:
+            win = self.preview_window = tk.Toplevel(self.root)
+            win.geometry("1000x600")
+            win.protocol("WM_DELETE_WINDOW", self.close_preview)
+            self.preview_offset_var = tk.StringVar()
+            self.preview_follow_var = tk.BooleanVar(value=False)
+            self.preview_status_var = tk.StringVar()
+
+            toolbar = ttk.Frame(win)
+            toolbar.pack(fill=tk.X)
+            ttk.Button(toolbar, text="Head", width=5, command=lambda: self.preview_goto("head"), padding=(0, 0)).pack(
+                side=tk.LEFT
+            )
+            ttk.Button(toolbar, text="Tail", width=5, command=lambda: self.preview_goto("tail"), padding=(0, 0)).pack(
+                side=tk.LEFT
+            )
+            ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+            ttk.Label(toolbar, text="Offset").pack(side=tk.LEFT, padx=(0, 3))
+            offset_entry = ttk.Entry(toolbar, textvariable=self.preview_offset_var, width=12)
+            offset_entry.bind("<Return>", lambda e: self.preview_goto_offset())
+            offset_entry.pack(side=tk.LEFT)
+            ttk.Button(toolbar, text="Go", width=3, command=self.preview_goto_offset, padding=(0, 0)).pack(side=tk.LEFT)
+            ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+            ttk.Checkbutton(
+                toolbar, text="Follow", variable=self.preview_follow_var, command=self.toggle_follow
+            ).pack(side=tk.LEFT)
+
+            text_frame = ttk.Frame(win)
+            text_frame.pack(fill=tk.BOTH, expand=True)
+            v_scroll = ttk.Scrollbar(text_frame, orient="vertical")
+            v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+            h_scroll = ttk.Scrollbar(text_frame, orient="horizontal")
+            h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
+            self.preview_text = tk.Text(
+                text_frame, wrap="none", font="TkFixedFont", state="disabled", xscrollcommand=h_scroll.set,
+                yscrollcommand=lambda first, last: (v_scroll.set(first, last), self.on_preview_scroll(first, last)),
+            )
+            v_scroll.configure(command=self.preview_text.yview)
+            h_scroll.configure(command=self.preview_text.xview)
+            self.preview_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+            ttk.Label(win, textvariable=self.preview_status_var, anchor="w").pack(fill=tk.X, padx=5)
+        self.preview_window.title(f"Preview: {self.preview_target[2]}")
+        self.preview_follow_var.set(False)
+        self.preview_goto("head")
 
-    def subprocess_run(self, cmd, stdout, stderr, text):
-        try:
-            with self.busy_cursor(self.root):
-                result = subprocess.run(cmd, stdout=stdout, stderr=stderr, text=text)
-                return result
-        except subprocess.CalledProcessError:
-            raise
+    def close_preview(self):
+        self.stop_follow()
+        if self.preview_job:
+            self.preview_job.cancel()
+            self.preview_job = None
+        self.preview_window.destroy()
+        self.preview_window = None
 
-    def adb_base(self):
-        """Return base adb command with selected device option."""
-        base = ["adb"]
-        if self.device_id:
-            base += ["-s", self.device_id]
-        return base
+    def preview_goto_offset(self):
+        offset = parse_size(self.preview_offset_var.get().strip().replace(",", ""))
+        if offset < 0:
+            messagebox.showerror("Preview", "Offset must be a byte count such as 1048576 or 1M", parent=self.preview_window)
+            return
+        self.preview_goto(offset)
 
-    def run_adb(self, args):
-        """Run an adb command with the currently selected device (if any)."""
-        self.error_var.set("")
-        try:
-            cmd = ["adb"]
-            if self.device_id:
-                cmd += ["-s", self.device_id]
-            cmd += args
-            result = self.subprocess_run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if result.returncode != 0:
-                self.error_var.set(result.stderr.strip())
-                print(result.stderr.strip())
-            return result.stdout
-        except Exception as e:
-            self.error_var.set(str(e))
-            print(str(e))
+    def preview_goto(self, where):
+        """Show the first pages of the file ("head"), its last ones ("tail") or those around a byte offset."""
+        self.stop_follow()
+        self.preview_follow_var.set(False)
+        device_id, run_as_val, path = self.preview_target
 
-    def detect_devices(self):
-        """Populate self.devices and default device selection."""
-        try:
-            res = self.subprocess_run(["adb", "devices"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-            if res.returncode != 0:
-                messagebox.showerror("ADB Error", res.stderr.strip())
-                self.root.destroy()
-                return
-            lines = [l.strip() for l in res.stdout.splitlines()[1:] if l.strip()]
-            self.devices = [l.split()[0] for l in lines if "device" in l]
-            if not self.devices:
-                messagebox.showerror("No Devices", "No connected Android devices detected.")
-                self.root.destroy()
+        def work(job):
+            size = self.remote_size(job, device_id, run_as_val, path)
+            if where == "head":
+                first = 0
+            elif where == "tail":
+                first = max(0, (size - 1) // PREVIEW_PAGE - 1)
+            else:
+                first = min(where, max(size - 1, 0)) // PREVIEW_PAGE
+            # 3 bytes more complete a character crossing the end (see decode_page)
+            data = self.read_range(job, device_id, run_as_val, path, first * PREVIEW_PAGE, 2 * PREVIEW_PAGE + 3)
+            return size, first * PREVIEW_PAGE, data
+
+        def done(result):
+            if self.preview_job is not job:
                 return
-            self.device_id = self.devices[0]
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
-            self.root.destroy()
+            self.preview_job = None
+            size, offset, data = result
+            self.preview_reset(size, offset, data, min(len(data), 2 * PREVIEW_PAGE))
+            if where == "tail":
+                self.preview_text.see("end")
+            elif where != "head":
+                skipped = decode_page(data, where - offset, offset)
+                self.preview_text.yview(f"1.0 + {len(skipped)} chars")
 
-    def refresh_devices(self):
-        """Refresh list of connected devices and update combobox."""
-        prev = self.device_id
-        self.detect_devices()
-        # update combobox values and selection
-        if hasattr(self, "device_combo"):
-            self.device_combo["values"] = self.devices
-            if prev in self.devices:
-                self.device_var.set(prev)
-                self.device_id = prev
+        if self.preview_job:
+            self.preview_job.cancel()
+        job = self.preview_job = self.submit(f"preview {path}", work, done, "Preview Error")
+
+    def preview_reset(self, size, offset, data, length):
+        """Replace the preview contents by the length bytes read at offset of a file of the given size
+        (data may hold up to 3 bytes more, see decode_page)."""
+        self.preview_size = size
+        for page in self.preview_pages:
+            self.preview_text.mark_unset(page[2])
+        self.preview_pages.clear()
+        self.preview_text.configure(state="normal")
+        self.preview_text.delete("1.0", "end")
+        self.preview_text.configure(state="disabled")
+        for start in range(0, length, PREVIEW_PAGE):
+            nbytes = min(PREVIEW_PAGE, length - start)
+            text = decode_page(data[start:start + nbytes + 3], nbytes, offset + start)
+            self.preview_add(offset + start, nbytes, text)
+        if not length:
+            self.preview_show_status()
+
+    def preview_add(self, offset, nbytes, text, at_end=True):
+        """Insert one page (or data appended by follow mode) and drop pages beyond PREVIEW_PAGES
+        from the other end, keeping the line at the top of the view in place."""
+        view = self.preview_text
+        view.configure(state="normal")
+        view.mark_set("preview_top", "@0,0")
+        view.mark_gravity("preview_top", "right")
+        pages = self.preview_pages
+        if at_end and pages and pages[-1][1] + nbytes <= PREVIEW_PAGE and pages[-1][0] + pages[-1][1] == offset:
+            view.insert("end-1c", text)  # follow mode: grow the last page
+            pages[-1][1] += nbytes
+        else:
+            mark = f"preview_page_{offset}"
+            if at_end:
+                view.mark_set(mark, "end-1c")
+                view.mark_gravity(mark, "left")
+                view.insert("end-1c", text)
+                pages.append([offset, nbytes, mark])
             else:
-                self.device_var.set(self.device_id)
-        self.list_files()
+                view.mark_set("preview_split", "1.0")
+                view.mark_gravity("preview_split", "right")
+                view.insert("1.0", text)
+                if pages:
+                    view.mark_set(pages[0][2], "preview_split")
+                view.mark_set(mark, "1.0")
+                view.mark_gravity(mark, "left")
+                pages.appendleft([offset, nbytes, mark])
+        while len(pages) > 1 and sum(page[1] for page in pages) > PREVIEW_PAGES * PREVIEW_PAGE:
+            if at_end:
+                _, _, dropped = pages.popleft()
+                view.delete("1.0", pages[0][2])
+            else:
+                _, _, dropped = pages.pop()
+                view.delete(dropped, "end-1c")
+            view.mark_unset(dropped)
+        view.yview("preview_top")
+        view.configure(state="disabled")
+        self.preview_show_status()
 
-    def on_device_change(self, event=None):
-        sel = self.device_var.get()
-        if sel and sel != self.device_id:
-            self.device_id = sel
-            self.current_path = "/"
-            self.list_files()
+    def preview_show_status(self):
+        pages = self.preview_pages
+        start, end = (pages[0][0], pages[-1][0] + pages[-1][1]) if pages else (0, 0)
+        following = ", following" if self.preview_follow_job else ""
+        self.preview_status_var.set(
+            f"bytes {start:,}–{end:,} of {self.preview_size:,} ({format_size(end - start)} held{following})"
+        )
 
-    def list_files(self):
-        self.total_var.set("")
-        self.amount_var.set("")
-        self.file_list.delete(*self.file_list.get_children())
-        # Update the Name column header to show current path
-        # self.file_list.heading("Name", text=self.current_path, anchor="w")
-        self.path_var.set(self.current_path)
-        # Use persistent run-as if present
-        run_as_val = self.run_as_var.get().strip()
-        # self.current_path may contain spaces
-        if run_as_val and self.current_path.startswith("/data/data/"):
-            output = self.run_adb(["shell", "run-as", run_as_val, "ls", "-lah", f"'{self.current_path}'"])
+    def on_preview_scroll(self, first, last):
+        """Fetch the next or previous page when the view gets near the end of what is held."""
+        if self.preview_job or self.preview_follow_job or not self.preview_pages:
+            return
+        pages = self.preview_pages
+        device_id, run_as_val, path = self.preview_target
+        # pages held may start anywhere (follow mode appends as data arrives): read exact ranges
+        if float(last) > 0.9 and pages[-1][0] + pages[-1][1] < self.preview_size:
+            offset, at_end = pages[-1][0] + pages[-1][1], True
+            length = PREVIEW_PAGE
+        elif float(first) < 0.1 and pages[0][0] > 0:
+            offset, at_end = max(0, pages[0][0] - PREVIEW_PAGE), False
+            length = pages[0][0] - offset
         else:
-            output = self.run_adb(["shell", "ls", "-lah", f"'{self.current_path}'"])
-        if not output:
             return
-        output = output.replace("                ?", " ????-??-?? ??:??")        
-        # Collect entries and sort so that directories appear before files, each group alphabetically
-        entries = []
-        amount = 0
-        for line in output.strip().splitlines():
-            if not line:
-                continue
-            parts = line.split(None, 7)
-            if len(parts) < 6:
-                self.total_var.set(line)
-                continue
-            perms = parts[0]
-            owner = parts[2] if len(parts) > 2 else ""
-            group = parts[3] if len(parts) > 3 else ""
-            date = " ".join(parts[5:7]) if len(parts) > 6 else ""
-            name = parts[-1]
-            if perms.startswith("d"):
-                type_or_size = "dir"
+
+        def done(data):
+            if self.preview_job is not job:
+                return
+            self.preview_job = None
+            nbytes = min(len(data), length)
+            if nbytes:
+                self.preview_add(offset, nbytes, decode_page(data, nbytes, offset), at_end)
+
+        job = self.preview_job = self.submit(
+            f"preview {path}",
+            lambda job: self.read_range(job, device_id, run_as_val, path, offset, length + 3),
+            done,
+            "Preview Error",
+        )
+
+    def toggle_follow(self):
+        if self.preview_follow_var.get():
+            self.start_follow()
+        else:
+            self.stop_follow()
+            self.preview_show_status()
+
+    def start_follow(self):
+        """Show the end of the file and keep appending what is written to it (tail -f over exec-out)."""
+        if self.preview_job:
+            self.preview_job.cancel()
+            self.preview_job = None
+        device_id, run_as_val, path = self.preview_target
+
+        def work(job):
+            size = self.remote_size(job, device_id, run_as_val, path)
+            first = max(0, (size - 1) // PREVIEW_PAGE)
+            data = self.read_range(job, device_id, run_as_val, path, first * PREVIEW_PAGE, PREVIEW_PAGE)
+            offset = first * PREVIEW_PAGE + len(data)
+            job.post(self.follow_started, job, size, first * PREVIEW_PAGE, data)
+            tail = f"tail -c +{offset + 1} -f {shlex.quote(path)}"
+            if run_as_val:
+                tail = f"run-as {shlex.quote(run_as_val)} {tail}"
+            proc = job.popen(
+                self.adb_base(device_id) + ["exec-out", tail],
+                stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            started = offset
+            try:
+                for chunk in iter(lambda: proc.stdout.read1(STREAM_CHUNK), b""):
+                    job.post(self.follow_data, job, offset, len(chunk), decoder.decode(chunk))
+                    offset += len(chunk)
+                proc.wait()
+            finally:
+                job.release(proc, offset - started)
+
+        def done(_):
+            if self.preview_follow_job is job:
+                self.preview_follow_job = None
+                self.preview_follow_var.set(False)
+                self.preview_show_status()
+
+        job = self.preview_follow_job = self.submit(f"tail -f {path}", work, done, "Preview Error")
+
+    def follow_started(self, job, size, offset, data):
+        if self.preview_follow_job is job:
+            self.preview_reset(size, offset, data, len(data))
+            self.preview_text.see("end")
+
+    def follow_data(self, job, offset, nbytes, text):
+        """Append bytes written to the followed file, staying at the bottom if the view was there."""
+        if self.preview_follow_job is not job:
+            return
+        at_bottom = self.preview_text.yview()[1] >= 0.999
+        self.preview_size = max(self.preview_size, offset + nbytes)
+        self.preview_add(offset, nbytes, text)
+        if at_bottom:
+            self.preview_text.see("end")
+
+    def stop_follow(self):
+        if self.preview_follow_job:
+            self.preview_follow_job.cancel()
+            self.preview_follow_job = None
+
+    def plan_sync(self, job, direction, device_id, run_as_val, local_root, remote_root, delete=False, checksum=""):
+        """Compare local_root with remote_root; returns (sync_plan actions, entries on the source side).
+
+        direction "pull" makes local_root match the device, "push" the other way round.
+        checksum ("md5" or "sha1") compares files of equal size by content instead of mtime.
+        """
+        if not remote_root.startswith(f"/data/data/{run_as_val}"):
+            run_as_val = ""
+
+        def shell(job, command, kind=None):
+            return self.shell(job, command, device_id, run_as_val, background=True, kind=kind)
+
+        fmt = self.listing_format(job, device_id, run_as_val)
+        if fmt not in INDEX_FORMATS:
+            raise AdbError("sync needs find -printf or stat -c on the device")
+        remote = remote_tree(job, shell, fmt, remote_root)
+        if remote is None:
+            if direction == "pull":
+                raise AdbError(f"{remote_root}: not a directory on the device")
+            remote = {}
+        if os.path.isdir(local_root):
+            local = local_tree(local_root)
+        elif direction == "push":
+            raise AdbError(f"{local_root}: not a local directory")
+        else:
+            local = {}
+
+        def same_content(paths):
+            sums = remote_checksums(job, shell, remote_root, paths, checksum)
+            return {
+                p for p in paths
+                if sums.get(p) == file_checksum(os.path.join(local_root, *p.split("/")), checksum)
+            }
+
+        source, target = (remote, local) if direction == "pull" else (local, remote)
+        return sync_plan(source, target, delete, same_content if checksum else None), len(source)
+
+    def apply_sync(self, job, progress, plan, direction, device_id, run_as_val, native, local_root, remote_root):
+        """Carry out a sync plan: deletions, then new directories, then the file transfers.
+
+        Transferred files get the mtime of their source so that the next sync skips them.
+        """
+        shell_run_as = run_as_val if remote_root.startswith(f"/data/data/{run_as_val}") else ""
+        remote_root = normalize_path(remote_root)
+
+        def remote(path):
+            return remote_root.rstrip("/") + "/" + path
+
+        def local(path):
+            return os.path.join(local_root, *path.split("/"))
+
+        def run_batched(command, items):
+            for i in range(0, len(items), SYNC_BATCH):
+                res = self.shell(job, " && ".join(command(*item) for item in items[i:i + SYNC_BATCH]),
+                                 device_id, shell_run_as, background=True)
+                if res.returncode != 0:
+                    raise AdbError(res.stderr.strip() or f"sync failed in {remote_root}")
+
+        deletes = [path for action, path, _, _ in plan if action == "delete"]
+        dirs = [path for action, path, _, _ in plan if action == "mkdir"]
+        files = [(path, size, mtime) for action, path, size, mtime in plan if action in ("copy", "update")]
+        total = sum(size for _, size, _ in files)
+        if direction == "pull":
+            for path in deletes:
+                if os.path.isdir(local(path)) and not os.path.islink(local(path)):
+                    shutil.rmtree(local(path))
+                else:
+                    os.remove(local(path))
+            for path in [""] + dirs:
+                os.makedirs(local(path), exist_ok=True)
+        else:
+            run_batched(lambda path: f"rm -rf {shlex.quote(remote(path))}", [(path,) for path in deletes])
+            run_batched(lambda path: f"mkdir -p {shlex.quote(remote(path))}", [("",)] + [(path,) for path in dirs])
+        done = 0
+        for path, size, mtime in files:
+            job.check()
+
+            def file_progress(file_done, file_total, before=done):
+                progress(before + min(file_done, size), total)
+
+            if direction == "pull":
+                self.pull_file(job, file_progress, device_id, run_as_val, native, remote(path), local(path), size)
+                os.utime(local(path), (mtime, mtime))
             else:
-                # parts[4] is size when using ls -lh (e.g., "1.2K", "512")
-                type_or_size = parts[4] if len(parts) > 4 else "file"
-            entries.append((name, type_or_size, owner, group, date, perms))
-            if name not in (".", ".."):
-                amount += 1
-
-        if self.sort_col == "1":
-            # Sort: directories first, then files; within each group, sort alphabetically (case-insensitive)
-            entries.sort(key=lambda x: (x[1] != "dir", x[0].lower()), reverse=not self.sort_asc)
-            self.set_headers_text()
-            self.file_list.heading("Name", text="Name" + ("↓" if self.sort_asc else "↑"), anchor="w")
-        elif self.sort_col == "2":
-            entries.sort(key=lambda x: x[1].lower(), reverse=not self.sort_asc)
-            self.set_headers_text()
-            self.file_list.heading("Size", text="Size" + ("↓" if self.sort_asc else "↑"))
-        elif self.sort_col == "3":
-            entries.sort(key=lambda x: x[2].lower(), reverse=not self.sort_asc)
-            self.set_headers_text()
-            self.file_list.heading("Owner", text="Owner" + ("↓" if self.sort_asc else "↑"))
-        elif self.sort_col == "4":
-            entries.sort(key=lambda x: x[3].lower(), reverse=not self.sort_asc)
-            self.set_headers_text()
-            self.file_list.heading("Group", text="Group" + ("↓" if self.sort_asc else "↑"))
-        elif self.sort_col == "5":
-            entries.sort(key=lambda x: x[4].lower(), reverse=not self.sort_asc)
-            self.set_headers_text()
-            self.file_list.heading("Date", text="Modified" + ("↓" if self.sort_asc else "↑"))
-        elif self.sort_col == "6":
-            entries.sort(key=lambda x: x[5].lower(), reverse=not self.sort_asc)
-            self.set_headers_text()
-            self.file_list.heading("Permissions", text="Permissions" + ("↓" if self.sort_asc else "↑"))
-
-        for entry in entries:
-            self.file_list.insert("", "end", values=entry)
-        self.amount_var.set(f"[{amount}]")
+                self.push_file(job, file_progress, device_id, run_as_val, native, local(path), remote(path))
+            done += size
+            progress(done, total)
+        if direction == "push" and files:
+            run_batched(
+                lambda path, mtime: "touch -m -d {} {}".format(
+                    time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(mtime)), shlex.quote(remote(path))
+                ),
+                [(path, mtime) for path, _, mtime in files],
+            )
+        return len(files), total
 
-    def on_item_double_click(self, event):
-        selected = self.file_list.selection()
-        if not selected:
+    def show_sync(self):
+        """Open (or raise) the window syncing a local directory with a device directory."""
+        if self.sync_window is not None and self.sync_window.winfo_exists():
+            self.sync_window.deiconify()
+            self.sync_window.lift()
+            self.sync_remote_var.set(self.current_path)
             return
-        name = str(self.file_list.item(selected[0])["values"][0])
-        ftype = str(self.file_list.item(selected[0])["values"][1])
-        
-        if name == ".":
-            self.go_root()
+        win = self.sync_window = tk.Toplevel(self.root)
+        win.title("Sync")
+        win.geometry("900x450")
+        self.sync_remote_var = tk.StringVar(value=self.current_path)
+        self.sync_local_var = tk.StringVar()
+        self.sync_direction_var = tk.StringVar(value=SYNC_DIRECTIONS[0])
+        self.sync_checksum_var = tk.StringVar(value=SYNC_COMPARE[0])
+        self.sync_delete_var = tk.BooleanVar(value=False)
+        self.sync_summary_var = tk.StringVar()
+
+        paths = ttk.Frame(win)
+        paths.pack(fill=tk.X)
+        paths.columnconfigure(1, weight=1)
+        ttk.Label(paths, text="device").grid(row=0, column=0, sticky="w", padx=5)
+        ttk.Entry(paths, textvariable=self.sync_remote_var).grid(row=0, column=1, sticky="ew")
+        ttk.Label(paths, text="local").grid(row=1, column=0, sticky="w", padx=5)
+        ttk.Entry(paths, textvariable=self.sync_local_var).grid(row=1, column=1, sticky="ew")
+        ttk.Button(paths, text="…", width=2, command=self.browse_sync_local, padding=(0, 0)).grid(row=1, column=2)
+
+        toolbar = ttk.Frame(win)
+        toolbar.pack(fill=tk.X)
+        ttk.Combobox(
+            toolbar, textvariable=self.sync_direction_var, values=SYNC_DIRECTIONS, state="readonly", width=16
+        ).pack(side=tk.LEFT)
+        ttk.Label(toolbar, text="compare").pack(side=tk.LEFT, padx=(10, 5))
+        ttk.Combobox(
+            toolbar, textvariable=self.sync_checksum_var, values=SYNC_COMPARE, state="readonly", width=11
+        ).pack(side=tk.LEFT)
+        ttk.Checkbutton(toolbar, text="delete extras", variable=self.sync_delete_var).pack(side=tk.LEFT, padx=10)
+        ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+        ttk.Button(toolbar, text="Dry run", width=8, command=self.preview_sync, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Sync", width=6, command=self.start_sync, padding=(0, 0)).pack(side=tk.LEFT)
+
+        columns = ("Action", "Path", "Size")
+        tree_frame = ttk.Frame(win)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        v_scroll = ttk.Scrollbar(tree_frame, orient="vertical")
+        v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.sync_plan_list = ttk.Treeview(
+            tree_frame, columns=columns, show="headings", style="Mono.Treeview", yscrollcommand=v_scroll.set
+        )
+        v_scroll.configure(command=self.sync_plan_list.yview)
+        for col in columns:
+            self.sync_plan_list.heading(col, text=col, anchor="w")
+        self.sync_plan_list.column("Action", width=80, stretch=False)
+        self.sync_plan_list.column("Path", stretch=True)
+        self.sync_plan_list.column("Size", width=90, stretch=False, anchor="e")
+        self.sync_plan_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        ttk.Label(win, textvariable=self.sync_summary_var, anchor="w").pack(fill=tk.X, padx=5)
+
+    def browse_sync_local(self):
+        local_path = filedialog.askdirectory(title="Local directory", parent=self.sync_window)
+        if local_path:
+            self.sync_local_var.set(local_path)
+
+    def sync_settings(self):
+        """Read the sync window into plan_sync arguments (after job), or None if incomplete."""
+        local_root = self.sync_local_var.get().strip()
+        remote_root = self.sync_remote_var.get().strip()
+        if not local_root or not remote_root.startswith("/"):
+            messagebox.showinfo("Sync", "Choose a local directory and an absolute device path", parent=self.sync_window)
+            return None
+        direction = "pull" if self.sync_direction_var.get() == SYNC_DIRECTIONS[0] else "push"
+        checksum = self.sync_checksum_var.get()
+        return (
+            direction, self.device_id, self.run_as_var.get().strip(), local_root, remote_root,
+            self.sync_delete_var.get(), "" if checksum == SYNC_COMPARE[0] else checksum,
+        )
+
+    def show_sync_plan(self, plan, count):
+        self.sync_plan_list.delete(*self.sync_plan_list.get_children())
+        for action, path, size, _ in plan:
+            self.sync_plan_list.insert("", "end", values=(action, path, format_size(size) if size else ""))
+        actions = [action for action, _, _, _ in plan]
+        total = sum(size for action, _, size, _ in plan if action in ("copy", "update"))
+        unchanged = count - sum(1 for action in actions if action != "delete")
+        self.sync_summary_var.set(
+            f"{actions.count('copy')} new, {actions.count('update')} changed ({format_size(total)}), "
+            f"{actions.count('mkdir')} directories, {actions.count('delete')} to delete, {unchanged} unchanged"
+        )
+
+    def preview_sync(self):
+        """Dry run: show what a sync with the current settings would do."""
+        settings = self.sync_settings()
+        if settings is None:
             return
-            
-        if name == "..":
-            self.go_up()
+        self.sync_summary_var.set("comparing…")
+        self.submit(
+            "sync dry run", lambda job: self.plan_sync(job, *settings),
+            lambda result: self.show_sync_plan(*result), "Sync Error",
+        )
+
+    def start_sync(self):
+        """Queue a sync with the current settings; the plan is worked out again when it starts."""
+        settings = self.sync_settings()
+        if settings is None:
             return
-            
-        if ftype == "dir":
-            # If clicking on /data from root, use persistent run-as value
-            if self.current_path == "/" and name == "data":
-                run_as = self.run_as_var.get().strip()
-                if run_as:
-                    self.current_path = f"/data/data/{run_as}"
-                    self.list_files()
-                    return
-            self.current_path = os.path.join(self.current_path, name)
-            self.list_files()
-        else:
-            # It's a file – prompt user to choose save location and download via adb pull
-            if " -> " in name:
-                name = name.split(" -> ")[1]
-                self.current_path = os.path.join(self.current_path, name)
+        direction, device_id, run_as_val, local_root, remote_root = settings[:5]
+        native = self.native_var.get()
+
+        def run(job, progress):
+            plan, count = self.plan_sync(job, *settings)
+            job.post(self.show_sync_plan, plan, count)
+            self.apply_sync(job, progress, plan, direction, device_id, run_as_val, native, local_root, remote_root)
+
+        def done():
+            self.listing_cache.invalidate(device_id, remote_root, recursive=True)
+            root = normalize_path(remote_root)
+            if self.device_id == device_id and (
+                self.current_path == root or self.current_path.startswith(root.rstrip("/") + "/")
+            ):
                 self.list_files()
-                return
-            remote_path = os.path.join(self.current_path, name)
-            local_path = filedialog.asksaveasfilename(initialfile=name, title="Save As")
-            if not local_path:
-                return  # user cancelled
-            self.download_file_dialog(remote_path, local_path)
 
-    def go_root(self):
-        self.current_path = "/"
-        self.list_files()
+        label = f"{remote_root} → {local_root}" if direction == "pull" else f"{local_root} → {remote_root}"
+        on_done = done if direction == "push" else None
+        self.transfers.add(Transfer("sync", label, run, on_done=on_done, device=device_id))
+        self.show_transfers()
 
-    def go_up(self):
-        if self.current_path == "/":
+    def show_fan_out(self):
+        """Open (or raise) the window running operations on several devices at once."""
+        if self.fan_window is not None and self.fan_window.winfo_exists():
+            self.fan_window.deiconify()
+            self.fan_window.lift()
+            self.fan_path_var.set(self.current_path)
+            self.fill_fan_devices()
             return
-        self.current_path = os.path.dirname(self.current_path)
-        self.list_files()
+        win = self.fan_window = tk.Toplevel(self.root)
+        win.title("Multi-device")
+        win.geometry("900x400")
+        self.fan_path_var = tk.StringVar(value=self.current_path)
+        self.fan_summary_var = tk.StringVar()
 
-    def download_selected(self):
-        """Download the currently selected file."""
-        selected = self.file_list.selection()
-        if not selected:
-            messagebox.showinfo("Download", "No file selected")
-            return
-        name = str(self.file_list.item(selected[0])["values"][0])
-        ftype = str(self.file_list.item(selected[0])["values"][1])
-        remote_path = os.path.join(self.current_path, name)
-        if ftype == "dir":
-            local_path = filedialog.askdirectory()
-            if local_path:
-                self.download_dir_dialog(remote_path, local_path)
-        else:
-            local_path = filedialog.asksaveasfilename(
-                initialfile=name,
-                title="Save As",
-                defaultextension=os.path.splitext(name)[1] or ""
+        toolbar = ttk.Frame(win)
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text="List", width=7, command=self.fan_list, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Download", width=9, command=self.fan_pull, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Upload", width=7, command=self.fan_push, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="Delete", width=7, command=self.fan_delete, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+        ttk.Entry(toolbar, textvariable=self.fan_path_var).pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        body = ttk.Frame(win)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.fan_devices = tk.Listbox(body, selectmode=tk.MULTIPLE, exportselection=False, width=28)
+        self.fan_devices.pack(side=tk.LEFT, fill=tk.Y)
+        columns = ("Device", "Status", "Result")
+        self.fan_results = ttk.Treeview(body, columns=columns, show="headings", style="Mono.Treeview")
+        for col in columns:
+            self.fan_results.heading(col, text=col, anchor="w")
+        self.fan_results.column("Device", width=200, stretch=False)
+        self.fan_results.column("Status", width=90, stretch=False)
+        self.fan_results.column("Result", stretch=True)
+        self.fan_results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        ttk.Label(win, textvariable=self.fan_summary_var, anchor="w").pack(fill=tk.X, padx=5)
+        self.fill_fan_devices()
+
+    def fill_fan_devices(self):
+        self.fan_devices.delete(0, tk.END)
+        for serial in self.devices:
+            self.fan_devices.insert(tk.END, serial)
+        self.fan_devices.selection_set(0, tk.END)
+
+    def fan_serials(self):
+        serials = [self.fan_devices.get(i) for i in self.fan_devices.curselection()]
+        if not serials:
+            messagebox.showinfo("Multi-device", "No device selected", parent=self.fan_window)
+        return serials
+
+    def fan_out(self, name, serials, fn, describe=str):
+        """Run fn(job, progress, serial) for every serial in parallel and show one result row per device.
+
+        A failure on one device does not affect the others; describe(result) renders a success.
+        """
+        self.fan_results.delete(*self.fan_results.get_children())
+        rows = {serial: self.fan_results.insert("", "end", values=(serial, "running", "")) for serial in serials}
+        outcome = {}
+        started = time.monotonic()
+
+        def summary():
+            failed = sum(1 for ok in outcome.values() if not ok)
+            self.fan_summary_var.set(
+                f"{name}: {len(outcome)}/{len(serials)} finished, {failed} failed, "
+                f"{time.monotonic() - started:.1f}s"
             )
-            if local_path:
-                self.download_file_dialog(remote_path, local_path)
 
-    def upload_file(self):
-        """Prompt user to select a local file and upload it to the current path on the device."""
-        local_path = filedialog.askopenfilename(title="Select file to load")
+        def finish(serial, ok, value):
+            outcome[serial] = ok
+            if self.fan_results.exists(rows[serial]):
+                if ok:
+                    self.fan_results.item(rows[serial], values=(serial, "done", describe(value)))
+                else:
+                    status = "cancelled" if isinstance(value, JobCancelled) else "failed"
+                    self.fan_results.item(rows[serial], values=(serial, status, str(value)))
+            summary()
+
+        def progress(serial, done, total):
+            if serial not in outcome and self.fan_results.exists(rows[serial]):
+                percent = f"{done * 100 // total}% " if total else ""
+                self.fan_results.item(rows[serial], values=(serial, "running", percent + format_size(done)))
+
+        for serial in serials:
+            self.executor.submit(
+                f"{name} {serial}",
+                lambda job, s=serial: fn(job, throttled(job, lambda d, t, s=s: progress(s, d, t)), s),
+                lambda result, s=serial: finish(s, True, result),
+                lambda e, s=serial: finish(s, False, e),
+            )
+        summary()
+
+    def fan_list(self):
+        serials = self.fan_serials()
+        path = self.fan_path_var.get()
+        run_as_val, native = self.run_as_var.get().strip(), self.native_var.get()
+
+        def work(job, progress, serial):
+            listing, error = self.fetch_listing(job, serial, run_as_val, path, native)
+            if listing is None:
+                raise AdbError(error or "no output")
+            return listing
+
+        if serials:
+            self.fan_out("list", serials, work, lambda listing: f"{listing[2]} entries, {listing[0]}")
+
+    def fan_pull(self):
+        serials = self.fan_serials()
+        remote_path = self.fan_path_var.get()
+        if not serials:
+            return
+        local_dir = filedialog.askdirectory(title="Download into (one folder per device)", parent=self.fan_window)
+        if not local_dir:
+            return
+        run_as_val, native = self.run_as_var.get().strip(), self.native_var.get()
+
+        def work(job, progress, serial):
+            target = os.path.join(local_dir, serial)
+            os.makedirs(target, exist_ok=True)
+            in_sandbox = run_as_val and remote_path.startswith(f"/data/data/{run_as_val}")
+            is_dir = self.shell(job, f"test -d {shlex.quote(remote_path)}", serial, run_as_val if in_sandbox else "")
+            if is_dir.returncode == 0:
+                self.pull_dir(job, progress, serial, run_as_val, native, remote_path, target)
+            else:
+                local_path = os.path.join(target, os.path.basename(remote_path))
+                self.pull_file(job, progress, serial, run_as_val, native, remote_path, local_path)
+            return target
+
+        self.fan_out("pull", serials, work)
+
+    def fan_push(self):
+        serials = self.fan_serials()
+        remote_dir = self.fan_path_var.get()
+        if not serials:
+            return
+        local_path = filedialog.askopenfilename(title="Select file to load", parent=self.fan_window)
         if not local_path:
             return
-        remote_path = os.path.join(self.current_path, os.path.basename(local_path))
-        self.upload_file_dialog(local_path, remote_path)
+        remote_path = os.path.join(remote_dir, os.path.basename(local_path))
+        run_as_val, native = self.run_as_var.get().strip(), self.native_var.get()
 
-    def delete_selected(self):
-        """Delete the selected file or directory on the device after confirmation."""
-        selected = self.file_list.selection()
-        if not selected:
-            messagebox.showinfo("Delete", "No item selected")
+        def work(job, progress, serial):
+            self.push_file(job, progress, serial, run_as_val, native, local_path, remote_path)
+            job.post(self.listing_cache.invalidate, serial, remote_dir)
+            return remote_path
+
+        self.fan_out("push", serials, work)
+
+    def fan_delete(self):
+        serials = self.fan_serials()
+        remote_path = self.fan_path_var.get()
+        if not serials:
             return
-        name = str(self.file_list.item(selected[0])["values"][0])
-        remote_path = os.path.join(self.current_path, name)
-        if not messagebox.askyesno("Confirm Delete", f"Delete '{remote_path}' on device?"):
+        if not messagebox.askyesno(
+            "Confirm Delete", f"Delete '{remote_path}' on {len(serials)} devices?", parent=self.fan_window
+        ):
             return
-        self.error_var.set("")
         run_as_val = self.run_as_var.get().strip()
-        try:
-            if run_as_val and remote_path.startswith(f"/data/data/{run_as_val}"):
-                cmd = self.adb_base() + [
-                    "shell",
-                    "run-as",
-                    run_as_val,
-                    "rm",
-                    "-rf",
-                    f"'{remote_path}'",
-                ]
-            else:
-                cmd = self.adb_base() + ["shell", "rm", "-rf", f"'{remote_path}'"]
-            res = self.subprocess_run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        in_sandbox = run_as_val and remote_path.startswith(f"/data/data/{run_as_val}")
+
+        def work(job, progress, serial):
+            res = self.shell(job, f"rm -rf {shlex.quote(remote_path)}", serial, run_as_val if in_sandbox else "")
             if res.returncode != 0:
-                self.error_var.set(res.stderr.strip())
-                messagebox.showerror("Delete Error", self.error_var.get())
-                return
-            # refresh view
-            self.list_files()
-        except Exception as e:
-            self.error_var.set(str(e))
-            messagebox.showerror("Delete Error", str(e))
+                raise AdbError(res.stderr.strip())
+            job.post(self.listing_cache.invalidate, serial, remote_path, True)
+            job.post(self.listing_cache.invalidate, serial, os.path.dirname(remote_path))
+            return "deleted"
 
-    def download_dir_dialog(self, remote_path, local_path):
-        """Download a directory from the device to the given local path."""
-        self.error_var.set("")
-        try:
-            # Using adb pull is the most straightforward way. If run-as is required we'll try that first
-            run_as_val = self.run_as_var.get().strip()
-            if run_as_val and remote_path.startswith(f"/data/data/{run_as_val}"):
-                cmd = self.adb_base() + [
-                    "shell",
-                    "run-as",
-                    run_as_val,
-                    "cp",
-                    "-r",
-                    f"'{remote_path}'",
-                    f"'{local_path}'",
-                ]
-                res = self.subprocess_run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                if res.returncode != 0:
-                    self.error_var.set(res.stderr.strip())
-                    messagebox.showerror("Download Error", self.error_var.get())
-                    return
-            else:
-                cmd = self.adb_base() + ["pull", remote_path, local_path]
-                res = self.subprocess_run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                if res.returncode != 0:
-                    self.error_var.set(res.stderr.strip())
-                    messagebox.showerror("Download Error", self.error_var.get())
-                    return
-        except Exception as e:
-            self.error_var.set(str(e))
-            messagebox.showerror("Download Error", str(e))
+        self.fan_out("rm", serials, work)
 
-    def download_file_dialog(self, remote_path, local_path):
-        """Download a single file from the device to the given local path."""
-        self.error_var.set("")
-        try:
-            # Using adb pull is the most straightforward way. If run-as is required we'll try that first
-            run_as_val = self.run_as_var.get().strip()
-            pull_cmd = self.adb_base()
-            # When using run-as, we need to execute cat via shell because adb pull does not work with run-as
-            if run_as_val and remote_path.startswith(f"/data/data/{run_as_val}"):
-                # Use exec-out to stream file contents
-                with open(local_path, "wb") as f:
-                    cat_result = self.subprocess_run(
-                        self.adb_base() + [
-                            "exec-out",
-                            "run-as",
-                            run_as_val,
-                            "cat",
-                            remote_path,
-                        ],
-                        stdout=f,
-                        stderr=subprocess.PIPE,
-                        text=True,
-                    )
-                    if cat_result.returncode != 0:
-                        self.error_var.set(cat_result.stderr.decode().strip())
-                        messagebox.showerror("Download Error", self.error_var.get())
-                        return
-            else:
-                pull_result = self.subprocess_run(
-                    pull_cmd + ["pull", remote_path, local_path],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                )
-                if pull_result.returncode != 0:
-                    self.error_var.set(pull_result.stderr.strip())
-                    messagebox.showerror("Download Error", self.error_var.get())
-                    return
-            # messagebox.showinfo("Download Complete", f"Saved to {local_path}")
-        except Exception as e:
-            self.error_var.set(str(e))
-            messagebox.showerror("Download Error", str(e))
+    def find_index(self, device_id, create=False):
+        """Return the file index of a device; None if it was never built and create is not set."""
+        with self.sessions_lock:
+            index = self.indexes.get(device_id)
+            if index is None:
+                path = os.path.join(index_dir(), "index-" + re.sub(r"[^\w.-]", "_", device_id) + ".sqlite3")
+                if not create and not os.path.exists(path):
+                    return None
+                index = self.indexes[device_id] = DeviceIndex(path)
+        return index
 
-    def upload_file_dialog(self, local_path, remote_path):
-        """Upload a file from local_path to remote_path on device, handling run-as if needed."""
-        self.error_var.set("")
-        try:
-            run_as_val = self.run_as_var.get().strip()
-            if run_as_val and remote_path.startswith(f"/data/data/{run_as_val}"):
-                # First push to /sdcard for easier permissions
-                temp_path = f"/sdcard/{os.path.basename(remote_path)}"
-                push_result = self.subprocess_run(
-                    self.adb_base() + ["push", local_path, temp_path],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                )
-                if push_result.returncode != 0:
-                    self.error_var.set(push_result.stderr.strip())
-                    messagebox.showerror("Upload to /sdcard Error", self.error_var.get())
-                    return
-                # Then copy to /data using run-as
-                cp_result = self.subprocess_run(
-                    self.adb_base() + [
-                        "shell",
-                        "run-as",
-                        run_as_val,
-                        "cp",
-                        f"'{temp_path}'",
-                        f"'{remote_path}'",
-                    ],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                )
-                if cp_result.returncode != 0:
-                    self.error_var.set(cp_result.stderr.strip())
-                    messagebox.showerror("Copy to /data Error", self.error_var.get())
-                    return
-            else:
-                push_proc = self.subprocess_run(
-                    self.adb_base() + ["push", local_path, remote_path],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                )
-                if push_proc.returncode != 0:
-                    self.error_var.set(push_proc.stderr.strip())
-                    messagebox.showerror("Upload Error", self.error_var.get())
-                    return
-            # Optionally refresh view
-            self.list_files()
-        except Exception as e:
-            self.error_var.set(str(e))
-            messagebox.showerror("Upload Error", str(e))
+    def index_tree(self, refresh=False):
+        """Crawl (or incrementally refresh) the device index below the current path in the background."""
+        device_id, root = self.device_id, self.current_path
+        run_as_val = self.run_as_var.get().strip()
+        if not root.startswith(f"/data/data/{run_as_val}"):
+            run_as_val = ""
+        index = self.find_index(device_id, create=True)
+
+        def shell(job, command):
+            return self.shell(job, command, device_id, run_as_val, background=True)
+
+        def work(job):
+            fmt = self.listing_format(job, device_id, run_as_val)
+            if fmt not in INDEX_FORMATS:
+                raise AdbError("indexing needs find -printf or stat -c on the device")
+            progress = throttled(job, lambda done, total: self.search_status_var.set(
+                f"indexing {root}: {done}/{total} directories"
+            ), interval=0.25)
+            (index.refresh if refresh else index.crawl)(job, shell, fmt, root, run_as_val, progress)
+
+        def done(_):
+            self.run_search()
+
+        self.search_status_var.set(f"indexing {root}…")
+        self.submit(f"index {root}", work, done, "Index Error")
+
+    def show_search(self):
+        """Open (or raise) the window searching the device index by name."""
+        if self.search_window is not None and self.search_window.winfo_exists():
+            self.search_window.deiconify()
+            self.search_window.lift()
+            self.run_search()
+            return
+        win = self.search_window = tk.Toplevel(self.root)
+        win.title("Search")
+        win.geometry("900x500")
+
+        toolbar = ttk.Frame(win)
+        toolbar.pack(fill=tk.X)
+        ttk.Button(toolbar, text="Index here", width=10, command=self.index_tree, padding=(0, 0)).pack(side=tk.LEFT)
+        ttk.Button(
+            toolbar, text="Refresh", width=8, command=lambda: self.index_tree(refresh=True), padding=(0, 0)
+        ).pack(side=tk.LEFT)
+        ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+        search_entry = ttk.Entry(toolbar, textvariable=self.search_var)
+        search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        search_entry.bind("<KeyRelease>", self.schedule_search)
+        search_entry.focus_set()
+
+        columns = ("Path", "Size", "Date")
+        tree_frame = ttk.Frame(win)
+        tree_frame.pack(fill=tk.BOTH, expand=True)
+        v_scroll = ttk.Scrollbar(tree_frame, orient="vertical")
+        v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.search_results = ttk.Treeview(
+            tree_frame, columns=columns, show="headings", style="Mono.Treeview", yscrollcommand=v_scroll.set
+        )
+        v_scroll.configure(command=self.search_results.yview)
+        self.search_results.heading("Path", text="Path", anchor="w")
+        self.search_results.heading("Size", text="Size")
+        self.search_results.heading("Date", text="Modified")
+        self.search_results.column("Path", stretch=True)
+        self.search_results.column("Size", width=70, stretch=False, anchor="e")
+        self.search_results.column("Date", width=175, stretch=False, anchor="e")
+        self.search_results.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.search_results.bind("<Double-1>", self.on_search_double_click)
+        ttk.Label(win, textvariable=self.search_status_var, anchor="w").pack(fill=tk.X, padx=5)
+        self.run_search()
+
+    def schedule_search(self, event=None):
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(150, self.run_search)
+
+    def run_search(self):
+        """Query the index of the selected device for the pattern in the search field.
+
+        The query runs in the background: the index may be busy with a crawl, and a substring
+        search reads the whole table.
+        """
+        self.search_after = None
+        if self.search_window is None or not self.search_window.winfo_exists():
+            return
+        if self.search_job:
+            self.search_job.cancel()
+        device_id, pattern = self.device_id, self.search_var.get().strip()
+
+        def work(job):
+            index = self.find_index(device_id) if device_id else None
+            if index is None:
+                return None
+            dirs, files = index.stats()
+            return dirs, files, index.search(pattern) if pattern else []
+
+        def done(result):
+            if self.search_job is not job:
+                return
+            self.search_job = None
+            if self.search_window is None or not self.search_window.winfo_exists():
+                return
+            self.search_results.delete(*self.search_results.get_children())
+            if result is None:
+                self.search_status_var.set("No index for this device yet: open a directory and click \"Index here\"")
+                return
+            dirs, files, rows = result
+            for parent, name, perms, size, mtime in rows:
+                entry = FileEntry.from_fields(name, perms, "", "", size, mtime)
+                path = parent.rstrip("/") + "/" + name
+                self.search_results.insert("", "end", values=(path, entry.values[1], entry.values[4]))
+            self.search_status_var.set(f"{len(rows)} matches — index: {dirs} directories, {files} entries")
+
+        job = self.submit(f"search {pattern}", work, done)
+        self.search_job = job
+
+    def on_search_double_click(self, event):
+        selected = self.search_results.selection()
+        if not selected:
+            return
+        path = str(self.search_results.item(selected[0])["values"][0])
+        self.current_path = os.path.dirname(path) or "/"
+        self.list_files()
 
     def on_treeview_header_click(self, event):
-        """Sort treeview items by the clicked header."""
+        """Sort treeview items by the clicked header (shift-click adds a secondary key)."""
         region = self.file_list.identify_region(event.x, event.y)   
         if region != 'heading':
             return
         col = self.file_list.identify_column(event.x)
         if not col:
             return
-        if self.sort_col == col[1:]:
-            self.sort_asc = not self.sort_asc
+        col = col[1:]  # strip leading '#'
+        if col not in COLUMNS:
+            return
+        primary, asc = self.sort_spec[0]
+        if event.state & 0x0001:
+            # Shift-click adds the column as a further sort key, or toggles it if present
+            for i, (c, a) in enumerate(self.sort_spec):
+                if c == col:
+                    self.sort_spec[i] = (c, not a)
+                    break
+            else:
+                self.sort_spec.append((col, True))
+        elif primary == col:
+            self.sort_spec = [(col, not asc)]
         else:
-            self.sort_asc = True
-        self.sort_col = col[1:]  # strip leading '#'
-        self.list_files()
+            self.sort_spec = [(col, True)]
+        if self.streamed_rows:
+            self.show_streamed()
+        elif self.listing_key == (self.device_id, self.run_as_var.get().strip(), self.current_path):
+            self.show_entries()
+        else:
+            self.show_sort_headers()  # nothing of this path to sort yet: its listing sorts when it arrives
 
     def set_headers_text(self):
         self.file_list.heading("Name", text="Name", anchor="w")
@@ -456,21 +3706,50 @@ class ADBFileManager:
         root_btn.pack(side=tk.LEFT)
         up_btn = ttk.Button(toolbar, text="↑", width=2, command=self.go_up, padding=(0, 0))
         up_btn.pack(side=tk.LEFT)
-        refresh_btn = ttk.Button(toolbar, text="⟳", width=2, command=self.list_files, padding=(0, 0))
+        refresh_btn = ttk.Button(toolbar, text="⟳", width=2, command=self.refresh_listing, padding=(0, 0))
         refresh_btn.pack(side=tk.LEFT)
         download_btn = ttk.Button(toolbar, text="Download", width=9, command=self.download_selected, padding=(0, 0))
         download_btn.pack(side=tk.LEFT)
         upload_btn = ttk.Button(toolbar, text="Upload", width=7, command=self.upload_file, padding=(0, 0))
         upload_btn.pack(side=tk.LEFT)
+        upload_dir_btn = ttk.Button(toolbar, text="Upload dir", width=10, command=self.upload_dir, padding=(0, 0))
+        upload_dir_btn.pack(side=tk.LEFT)
         delete_btn = ttk.Button(toolbar, text="Delete", width=7, command=self.delete_selected, padding=(0, 0))
         delete_btn.pack(side=tk.LEFT)
+        copy_btn = ttk.Button(toolbar, text="Copy", width=5, command=self.copy_selected, padding=(0, 0))
+        copy_btn.pack(side=tk.LEFT)
+        move_btn = ttk.Button(
+            toolbar, text="Move", width=5, command=lambda: self.copy_selected(move=True), padding=(0, 0)
+        )
+        move_btn.pack(side=tk.LEFT)
+        mkdir_btn = ttk.Button(toolbar, text="New dir", width=7, command=self.make_dir, padding=(0, 0))
+        mkdir_btn.pack(side=tk.LEFT)
+        preview_btn = ttk.Button(toolbar, text="Preview", width=8, command=self.show_preview, padding=(0, 0))
+        preview_btn.pack(side=tk.LEFT)
+        transfers_btn = ttk.Button(toolbar, text="Transfers", width=9, command=self.show_transfers, padding=(0, 0))
+        transfers_btn.pack(side=tk.LEFT)
+        fan_btn = ttk.Button(toolbar, text="Devices", width=8, command=self.show_fan_out, padding=(0, 0))
+        fan_btn.pack(side=tk.LEFT)
+        search_btn = ttk.Button(toolbar, text="Search", width=7, command=self.show_search, padding=(0, 0))
+        search_btn.pack(side=tk.LEFT)
+        sync_btn = ttk.Button(toolbar, text="Sync", width=5, command=self.show_sync, padding=(0, 0))
+        sync_btn.pack(side=tk.LEFT)
+        stats_btn = ttk.Button(toolbar, text="Stats", width=6, command=self.show_stats, padding=(0, 0))
+        stats_btn.pack(side=tk.LEFT)
         ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
         self.device_var = tk.StringVar(value=self.device_id)
         self.device_combo = ttk.Combobox(toolbar, textvariable=self.device_var, values=self.devices, state="readonly", width=25)
         self.device_combo.pack(side=tk.LEFT)
         refresh_dev_btn = ttk.Button(toolbar, text="⟳", width=2, command=self.refresh_devices, padding=(0, 0))
         refresh_dev_btn.pack(side=tk.LEFT)
+        device_status_label = ttk.Label(toolbar, textvariable=self.device_status_var, foreground="gray")
+        device_status_label.pack(side=tk.LEFT, padx=5)
         self.device_combo.bind("<<ComboboxSelected>>", self.on_device_change)
+        ttk.Separator(toolbar, orient=tk.VERTICAL).pack(side=tk.LEFT, padx=3, fill=tk.Y)
+        cancel_btn = ttk.Button(toolbar, text="Cancel", width=7, command=self.cancel_jobs, padding=(0, 0))
+        cancel_btn.pack(side=tk.LEFT)
+        jobs_label = ttk.Label(toolbar, textvariable=self.jobs_var)
+        jobs_label.pack(side=tk.LEFT, padx=5)
 
         # Path field
         path_frame = ttk.Frame(frame)
@@ -525,6 +3804,14 @@ class ADBFileManager:
         runas_label.pack(side=tk.LEFT, padx=(5, 0))
         runas_entry = ttk.Entry(runas_frame, textvariable=self.run_as_var, width=25)
         runas_entry.pack(side=tk.LEFT, padx=(5, 0))
+        native_check = ttk.Checkbutton(
+            runas_frame, text="adb server socket", variable=self.native_var, command=self.refresh_devices
+        )
+        native_check.pack(side=tk.LEFT, padx=(10, 0))
+        compress_check = ttk.Checkbutton(runas_frame, text="compress tar", variable=self.compress_var)
+        compress_check.pack(side=tk.LEFT, padx=(10, 0))
+        verify_check = ttk.Checkbutton(runas_frame, text="verify checksum", variable=self.verify_var)
+        verify_check.pack(side=tk.LEFT, padx=(10, 0))
 
         amount_label = ttk.Label(runas_frame, textvariable=self.amount_var)
         amount_label.pack(side=tk.RIGHT, padx=(0, 5))
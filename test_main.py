@@ -0,0 +1,235 @@
+"""Tests for the parts of main.py that need neither a display nor a device.
+
+ShellSession runs against a local ["sh"], which speaks the same protocol as `adb shell`.
+"""
+
+import os
+import stat
+import struct
+import threading
+
+import pytest
+
+from fake_adb_server import FakeAdbHandler, FakeAdbServer
+from main import (
+    SYNC_MTIME_WINDOW, AdbError, AdbServerClient, DeviceIndex, Job, JobCancelled, ShellSession, compile_ops, parse_op_results,
+    sync_plan,
+)
+
+@pytest.fixture
+def session():
+    session = ShellSession(["sh"])
+    yield session
+    session.close()
+
+def test_session_output_without_trailing_newline(session):
+    res = session.run("printf 'a\\nb'")
+    assert (res.stdout, res.stderr, res.returncode) == ("a\nb", "", 0)
+    assert session.run("printf ''").stdout == ""
+    assert session.run("echo").stdout == "\n"
+
+def test_session_separates_stderr_and_reports_exit_status(session):
+    res = session.run("echo out; echo err >&2; (exit 3)")
+    assert (res.stdout, res.stderr, res.returncode) == ("out\n", "err\n", 3)
+    assert session.run("true").returncode == 0
+
+def test_session_keeps_marker_like_output(session):
+    fake = f"__ADBGUI_{session._token}_"
+    command = f"printf '%s\\n%s 7\\n\\n%s' {fake} {fake}99__ {fake}"
+    res = session.run(command)
+    assert res.stdout == f"{fake}\n{fake}99__ 7\n\n{fake}"
+    assert res.returncode == 0
+    assert session.run("echo next").stdout == "next\n"
+
+def test_session_large_and_streamed_output(session):
+    size = 3 * ShellSession.CHUNK + 17
+    assert session.run(f"head -c {size} /dev/zero | tr '\\0' x").stdout == "x" * size
+    chunks = []
+    res = session.run("printf 'a\\0b\\0c\\0'", on_output=chunks.append)
+    assert b"".join(chunks) == b"a\0b\0c\0"
+    assert res.stdout == ""
+
+def test_session_restarts_after_close(session):
+    session.run("cd /")
+    session.close()
+    assert session.run("echo again").stdout == "again\n"
+
+def test_session_survives_a_cancelled_command(session):
+    session.run("true")
+    pid = session.proc.pid
+    job = Job(None, "listing")
+    threading.Timer(0.1, job.cancel).start()
+    chunks = []
+    with pytest.raises(JobCancelled):
+        session.run("echo early; sleep 0.3; echo late", job, chunks.append)
+    assert b"late" not in b"".join(chunks)
+    assert session.run("echo next").stdout == "next\n"
+    assert session.proc.pid == pid
+    with pytest.raises(JobCancelled):
+        session.run("echo never", job)
+
+def test_session_killed_when_a_cancelled_command_overruns(session):
+    session.CANCEL_GRACE = 0.1
+    job = Job(None, "checksum")
+    threading.Timer(0.1, job.cancel).start()
+    with pytest.raises(JobCancelled):
+        session.run("exec sleep 5", job)
+    assert session.run("echo next").stdout == "next\n"
+
+class LockedListHandler(FakeAdbHandler):
+    """Answers LIST of any directory named "locked" with FAIL."""
+
+    def sync_list(self, path):
+        if os.path.basename(path) != "locked":
+            return super().sync_list(path)
+        message = b"Permission denied"
+        self.request.sendall(struct.pack("<4s4I", b"FAIL", len(message), 0, 0, 0) + message)
+
+@pytest.fixture
+def device(tmp_path):
+    """A FakeAdbServer on a free port serving tmp_path/device; yields (root, client)."""
+    root = tmp_path / "device"
+    root.mkdir()
+    server = FakeAdbServer(("127.0.0.1", 0), str(root), ["fake-1"])
+    server.RequestHandlerClass = LockedListHandler
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield root, AdbServerClient("127.0.0.1", server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+def test_server_client_lists_and_stats(device):
+    root, client = device
+    (root / "sdcard").mkdir()
+    (root / "sdcard" / "a.txt").write_bytes(b"hello")
+    os.utime(root / "sdcard" / "a.txt", (1000, 1000))
+    assert client.devices() == [("fake-1", "device")]
+    entries = client.list_dir("fake-1", "/sdcard/")
+    assert [(name, stat.S_ISREG(mode), size, mtime) for name, mode, size, mtime in entries] == [
+        ("a.txt", True, 5, 1000)
+    ]
+    mode, size, mtime = client.stat("fake-1", "/sdcard/a.txt")
+    assert (stat.S_ISREG(mode), size, mtime) == (True, 5, 1000)
+    assert client.stat("fake-1", "/sdcard/missing")[0] == 0
+    with pytest.raises(AdbError, match="not found"):
+        client.list_dir("fake-2", "/sdcard/")
+
+def test_server_client_push_and_pull(device, tmp_path):
+    root, client = device
+    local = tmp_path / "up.bin"
+    data = os.urandom(3 * AdbServerClient.CHUNK + 5)
+    local.write_bytes(data)
+    os.chmod(local, 0o640)
+    os.utime(local, (2000, 2000))
+    progress = []
+    client.push("fake-1", str(local), "/up.bin", lambda done, total: progress.append((done, total)))
+    assert (root / "up.bin").read_bytes() == data
+    assert stat.S_IMODE(os.stat(root / "up.bin").st_mode) == 0o640
+    assert os.stat(root / "up.bin").st_mtime == 2000
+    assert progress[-1] == (len(data), len(data))
+    back = tmp_path / "back.bin"
+    client.pull("fake-1", "/up.bin", str(back))
+    assert back.read_bytes() == data
+
+def test_server_client_failed_pull_keeps_local_file(device, tmp_path):
+    _, client = device
+    local = tmp_path / "keep.txt"
+    local.write_text("old")
+    with pytest.raises(AdbError):
+        client.pull("fake-1", "/missing.txt", str(local))
+    assert local.read_text() == "old"
+    assert sorted(os.listdir(tmp_path)) == ["device", "keep.txt"]
+
+def test_server_client_pull_dir(device, tmp_path):
+    root, client = device
+    (root / "tree" / "sub").mkdir(parents=True)
+    (root / "tree" / "top.txt").write_text("top")
+    (root / "tree" / "sub" / "deep.txt").write_text("deep")
+    client.pull_dir("fake-1", "/tree", str(tmp_path / "out"))
+    assert (tmp_path / "out" / "top.txt").read_text() == "top"
+    assert (tmp_path / "out" / "sub" / "deep.txt").read_text() == "deep"
+    (root / "tree" / "locked").mkdir()
+    with pytest.raises(AdbError, match="Permission denied"):
+        client.pull_dir("fake-1", "/tree", str(tmp_path / "again"))
+    with pytest.raises(AdbError, match="Permission denied"):
+        client.list_dir("fake-1", "/tree/locked")
+
+def test_index_forgets_exactly_a_subtree(tmp_path):
+    index = DeviceIndex(str(tmp_path / "index.sqlite3"))
+    dirs = ["/sd", "/sd/d1", "/sd/d1/ü 中", "/sd/d10", "/sd/d1.x"]
+    with index.db:
+        index.db.executemany("INSERT INTO dirs VALUES (?, 0, '')", [(d,) for d in dirs])
+        index.db.executemany("INSERT INTO files VALUES (?, 'f', '-rw-r--r--', 1, 0)", [(d,) for d in dirs])
+    index._forget("/sd/d1")
+    assert [d for d, in index.db.execute("SELECT path FROM dirs ORDER BY path")] == ["/sd", "/sd/d1.x", "/sd/d10"]
+    assert index.stats() == (3, 3)
+    assert index.listing("/sd/d10")[2] == 1
+    index.close()
+
+def test_ops_run_per_item_with_quoted_paths(session, tmp_path):
+    root = str(tmp_path)
+    odd = os.path.join(root, "it's a \"file\" $HOME")
+    open(odd, "w").close()
+    open(os.path.join(root, "plain"), "w").close()
+    os.mkdir(os.path.join(root, "dst"))
+    ops = [
+        ("copy", odd, os.path.join(root, "dst")),
+        ("move", os.path.join(root, "missing"), os.path.join(root, "dst")),
+        ("move", os.path.join(root, "plain"), os.path.join(root, "dst")),
+        ("mkdir", os.path.join(root, "new dir", "sub")),
+        ("delete", odd),
+    ]
+    res = session.run(compile_ops(ops))
+    results = parse_op_results(res.stdout, len(ops))
+    assert [ok for ok, _ in results] == [True, False, True, True, True]
+    assert "missing" in results[1][1]
+    assert sorted(os.listdir(root)) == ["dst", "new dir"]
+    assert sorted(os.listdir(os.path.join(root, "dst"))) == sorted([os.path.basename(odd), "plain"])
+
+def test_parse_op_results_multiline_and_missing():
+    text = "\x1e0 1 first line\nsecond line\n\x1e1 0 \n"
+    assert parse_op_results(text, 3, "run-as: unknown package") == [
+        (False, "first line\nsecond line"),
+        (True, ""),
+        (False, "run-as: unknown package"),
+    ]
+
+def test_sync_plan_copies_updates_and_deletes():
+    source = {
+        "a": (True, 0, 100),
+        "a/new": (False, 5, 100),
+        "a/bigger": (False, 9, 100),
+        "a/touched": (False, 3, 100 + SYNC_MTIME_WINDOW + 1),
+        "a/close": (False, 3, 100 + SYNC_MTIME_WINDOW),
+        "was_file": (True, 0, 100),
+    }
+    target = {
+        "a": (True, 0, 50),
+        "a/bigger": (False, 4, 100),
+        "a/touched": (False, 3, 100),
+        "a/close": (False, 3, 100),
+        "was_file": (False, 1, 100),
+        "gone": (True, 0, 100),
+        "gone/inner": (False, 1, 100),
+    }
+    assert sync_plan(source, target) == [
+        ("delete", "was_file", 0, 0),
+        ("update", "a/bigger", 9, 100),
+        ("copy", "a/new", 5, 100),
+        ("update", "a/touched", 3, 100 + SYNC_MTIME_WINDOW + 1),
+        ("mkdir", "was_file", 0, 100),
+    ]
+    # extras go only with delete, and a deleted directory's contents are not listed again
+    deletes = [step for step in sync_plan(source, target, delete=True) if step[0] == "delete"]
+    assert deletes == [("delete", "gone", 0, 0), ("delete", "was_file", 0, 0)]
+
+def test_sync_plan_compares_equal_sizes_by_content():
+    source = {"x": (False, 3, 100), "y": (False, 3, 100), "z": (False, 4, 100)}
+    target = {"x": (False, 3, 100), "y": (False, 3, 100), "z": (False, 3, 100)}
+    asked = []
+
+    def same(paths):
+        asked.append(paths)
+        return {"x"}
+
+    assert sync_plan(source, target, same=same) == [("update", "z", 4, 100), ("update", "y", 3, 100)]
+    assert asked == [["x", "y"]]